@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Compares the size and encode / decode speed of the binary codec against json for blocks of signed transactions.
+
+    python3 benchmarks/codec_benchmark.py [transactions per block] [repetitions]
+"""
+
+import sys
+import json
+import time
+
+from pythereum import codec, generate_wallet, sign_item
+from pythereum.block import Block
+from pythereum.transaction import Transaction, signed_item
+
+
+def make_block(n_tx):
+    wallets = [generate_wallet(str(i)) for i in range(4)]
+    transactions = []
+    for i in range(n_tx):
+        sender, receiver = wallets[i % 4], wallets[(i + 1) % 4]
+        value = float(i + 1)
+        input_txids = [f"{i:064x}", f"{i + 1:064x}"]
+        item = signed_item(value, sender["public_key"], t_to=receiver["public_key"], input_txids=input_txids)
+        signature = sign_item(sender["private_key"], item)
+        transactions.append(Transaction(sender["public_key"], receiver["public_key"], value, signature, input_txids))
+    return Block(block_number=1, block_nonce="0" * 32, previous_block_hash="f" * 64,
+                 transactions=transactions).jsonify()
+
+
+def timed(func, arg, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        func(arg)
+    return (time.perf_counter() - start) / repetitions
+
+
+def main(n_tx=200, repetitions=200):
+    block = make_block(n_tx)
+    as_json = json.dumps(block).encode()
+    as_binary = codec.encode_block(block)
+    assert codec.decode_block(as_binary) == block
+
+    print(f"Block with {n_tx} transactions, {repetitions} repetitions")
+    print(f"{'':8}{'size (bytes)':>14}{'encode (ms)':>14}{'decode (ms)':>14}")
+    for name, encode, decode, encoded in (
+            ("json", lambda b: json.dumps(b).encode(), json.loads, as_json),
+            ("binary", codec.encode_block, codec.decode_block, as_binary)):
+        print(f"{name:8}{len(encoded):>14}{timed(encode, block, repetitions) * 1000:>14.3f}"
+              f"{timed(decode, encoded, repetitions) * 1000:>14.3f}")
+    print(f"binary size is {len(as_binary) / len(as_json):.1%} of json")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
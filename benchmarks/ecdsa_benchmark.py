@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Compares fixed-base multiplication by the curve generator with and without its precomputed window table: the
+one-off cost of building the table against the time saved on every key generation, signature and verification.
+
+    python3 benchmarks/ecdsa_benchmark.py [repetitions]
+"""
+
+import sys
+import time
+import random
+
+from pythereum.ecdsa import ecdsa
+from pythereum.ecdsa.curves import NIST192p, SECP256k1
+from pythereum.ecdsa.ellipticcurve import Point
+
+
+def timed(func, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        func()
+    return (time.perf_counter() - start) / repetitions
+
+
+def operations(generator, rng):
+    n = generator.order()
+    secret = rng.randrange(1, n)
+    public_key = ecdsa.Public_key(generator, generator * secret)
+    private_key = ecdsa.Private_key(public_key, secret)
+    digest = rng.randrange(1, n)
+    signature = private_key.sign(digest, rng.randrange(1, n))
+    return {
+        "keygen": lambda: generator * rng.randrange(1, n),
+        "sign": lambda: private_key.sign(digest, rng.randrange(1, n)),
+        "verify": lambda: public_key.verifies(digest, signature),
+    }
+
+
+def main(repetitions=50):
+    rng = random.Random(0)
+    for curve in (NIST192p, SECP256k1):
+        g = curve.generator
+        plain = Point(g.curve(), g.x(), g.y(), g.order())
+        fresh = Point(g.curve(), g.x(), g.y(), g.order(), generator=True)
+        build = timed(fresh.precompute, 1)
+
+        print(f"{curve.name}: building the generator table takes {build * 1000:.1f} ms")
+        print(f"{'':10}{'plain (ms)':>14}{'table (ms)':>14}{'speedup':>10}{'break even':>12}")
+        with_table = operations(fresh, rng)
+        for name, func in operations(plain, rng).items():
+            before = timed(func, repetitions)
+            after = timed(with_table[name], repetitions)
+            saved = before - after
+            break_even = f"{build / saved:.0f} ops" if saved > 0 else "never"
+            print(f"{name:10}{before * 1000:>14.3f}{after * 1000:>14.3f}{before / after:>9.1f}x{break_even:>12}")
+        print()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
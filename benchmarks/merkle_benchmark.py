@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+"""
+Compares building merkle trees over hex strings (blocks before version 3) with building them over raw digests.
+
+    python3 benchmarks/merkle_benchmark.py [leaves] [repetitions]
+"""
+
+import sys
+import time
+import secrets
+
+from pythereum.block import MerkleTree, MerkleAccumulator
+
+
+def timed(func, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        func()
+    return (time.perf_counter() - start) / repetitions
+
+
+def build_tree(leaves, mode):
+    tree = MerkleTree(*leaves, mode=mode)
+    tree.make_tree()
+    return tree.root
+
+
+def build_accumulator(leaves, mode):
+    return MerkleAccumulator(*leaves, mode=mode).root
+
+
+def main(n_leaves=10000, repetitions=20):
+    leaves = [secrets.token_hex(32) for _ in range(n_leaves)]
+    for mode in ("hex", "binary"):
+        assert build_tree(leaves, mode) == build_accumulator(leaves, mode)
+
+    print(f"{n_leaves} leaves, {repetitions} repetitions")
+    print(f"{'':8}{'tree (ms)':>14}{'accumulator (ms)':>18}")
+    results = {}
+    for mode in ("hex", "binary"):
+        results[mode] = timed(lambda: build_tree(leaves, mode), repetitions)
+        accumulated = timed(lambda: build_accumulator(leaves, mode), repetitions)
+        print(f"{mode:8}{results[mode] * 1000:>14.3f}{accumulated * 1000:>18.3f}")
+    print(f"binary tree is {results['hex'] / results['binary']:.2f}x faster than hex")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""
+Measures mining throughput (blocks per minute and hash rate) for a range of difficulties, to size mining hardware.
+
+    python3 benchmarks/mining_benchmark.py [blocks per difficulty] [workers] [difficulty ...]
+"""
+
+import sys
+import secrets
+
+from pythereum.block import Block
+from pythereum.difficulty import target_from_difficulty
+from pythereum.miner import Miner
+
+
+def benchmark(difficulty, n_blocks, miner):
+    target = target_from_difficulty(difficulty)
+    hashes = seconds = 0
+    previous_block_hash = secrets.token_hex(32)
+    for number in range(1, n_blocks + 1):
+        block = Block(block_number=number, block_nonce=secrets.token_hex(16),
+                      previous_block_hash=previous_block_hash)
+        miner.mine(block, target)
+        hashes += miner.last_stats["hashes"]
+        seconds += miner.last_stats["seconds"]
+        previous_block_hash = block.hash
+    return {"blocks_per_minute": n_blocks / seconds * 60 if seconds else float("inf"),
+            "hash_rate": hashes / seconds if seconds else 0.0,
+            "expected_hashes": 2 ** 256 / (target + 1)}
+
+
+def main(n_blocks=10, workers=1, *difficulties):
+    difficulties = [float(d) for d in difficulties] or [1, 2, 3, 3.5, 4, 4.5]
+    miner = Miner(workers)
+    print(f"{n_blocks} blocks per difficulty, {miner.workers} worker(s)")
+    print(f"{'difficulty':>10}{'blocks/min':>14}{'hashes/s':>14}{'hashes/block':>14}")
+    for difficulty in difficulties:
+        result = benchmark(difficulty, n_blocks, miner)
+        print(f"{difficulty:>10}{result['blocks_per_minute']:>14.1f}{result['hash_rate']:>14.0f}"
+              f"{result['expected_hashes']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]], *sys.argv[3:])
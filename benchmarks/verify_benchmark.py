@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Compares signature verification computing u1 * G + u2 * Q as two scalar multiplications and an addition with the
+joint Straus multiplication used by Public_key.verifies, in verifications per second.
+
+    python3 benchmarks/verify_benchmark.py [repetitions]
+"""
+
+import sys
+import time
+import random
+
+from pythereum.ecdsa import ecdsa, numbertheory
+from pythereum.ecdsa.curves import NIST192p, SECP256k1
+
+
+def best_of(func, repetitions, rounds=5):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            func()
+        elapsed = (time.perf_counter() - start) / repetitions
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def separate_verifies(public_key, digest, signature):
+    # Public_key.verifies before the joint multiplication
+    G = public_key.generator
+    n = G.order()
+    c = numbertheory.inverse_mod(signature.s, n)
+    xy = (digest * c) % n * G + (signature.r * c) % n * public_key.point
+    return xy.x() % n == signature.r
+
+
+def main(repetitions=100):
+    rng = random.Random(0)
+    print(f"{'':12}{'separate (/s)':>16}{'straus (/s)':>16}{'gain':>8}")
+    for curve in (NIST192p, SECP256k1):
+        g = curve.generator
+        n = g.order()
+        secret = rng.randrange(1, n)
+        public_key = ecdsa.Public_key(g, g * secret)
+        digest = rng.randrange(1, n)
+        signature = ecdsa.Private_key(public_key, secret).sign(digest, rng.randrange(1, n))
+        assert public_key.verifies(digest, signature) and separate_verifies(public_key, digest, signature)
+
+        separate = best_of(lambda: separate_verifies(public_key, digest, signature), repetitions)
+        joint = best_of(lambda: public_key.verifies(digest, signature), repetitions)
+        print(f"{curve.name:12}{1 / separate:>16.0f}{1 / joint:>16.0f}{separate / joint:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
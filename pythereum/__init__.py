@@ -1,4 +1,5 @@
-from pythereum.wallet import generate_wallet, generate_public_key, sign_item, verify_signature, verify_key_pair
+from pythereum.wallet import generate_wallet, generate_public_key, sign_item, verify_signature, verify_key_pair, \
+    key_cache_stats, verify_batch
 from pythereum.compile import CompileContract
 from pythereum.transaction import Transaction, Contract, Message
 from pythereum.pythereum import Pythereum
@@ -20,7 +20,7 @@ def create_wallet():
 
 @get('/get_difficulty')
 def get_difficulty():
-    return {"status_code": 200, "difficulty": pth.difficulty}
+    return {"status_code": 200, "difficulty": pth.difficulty, "target": f"{pth.target:064x}"}
 
 
 @get('/get_blocks')
@@ -39,10 +39,35 @@ def get_block(block_id=None):
     return {"status_code": 400, "block": None, "message": "Not block_id/hash passed"}
 
 
+@get('/get_transaction_proof')
+@get('/get_transaction_proof/<txid>')
+def get_transaction_proof(txid=None):
+    if not txid:
+        txid = request.query.get("txid")
+    if not txid:
+        response.status = 400
+        return {"status_code": 400, "proof": None, "message": "No txid passed"}
+    proof = pth.get_transaction_proof(txid)
+    if not proof:
+        response.status = 404
+        return {"status_code": 404, "proof": None, "message": "Transaction not found"}
+    return {"status_code": 200, **proof}
+
+
 @get('/get_balance')
 def get_balance():
     public_key = request.query.get("public_key")
+    block_number = request.query.get("block_number")
     if public_key:
+        if block_number:
+            try:
+                block_number = int(block_number)
+            except ValueError:
+                response.status = 400
+                return {"status_code": 400, "public_key": public_key, "balance": None,
+                        "message": "Malformed block_number. Must be a valid integer"}
+            return {"status_code": 200, "public_key": public_key, "block_number": block_number,
+                    "balance": pth.get_balance(public_key, block_number)}
         return {"status_code": 200, "public_key": public_key, "balance": pth.get_balance(public_key)}
     response.status = 400
     return {"status_code": 400, "public_key": public_key, "balance": None, "message": "No public_key "
@@ -52,9 +77,14 @@ def get_balance():
 @post('/mine')
 @post('/mine_block')
 def mine():
-    blk = pth.mine_block()
+    try:
+        limits = {name: int(request.POST.get(name)) for name in ("n_tx", "max_tx_bytes") if request.POST.get(name)}
+    except ValueError as e:
+        response.status = 400
+        return {"status_code": 400, "block": None, "message": f"Malformed block size limit. {str(e)}"}
+    blk = pth.mine_block(**limits, fee_to=request.POST.get("fee_to") or None)
     if blk:
-        return {"status_code": 200, "block": blk}
+        return {"status_code": 200, "block": blk, "mining_stats": pth.mining_stats}
     response.status = 400
     return {"status_code": 400, "block": None, "message": "Mempool empty. Nothing to mine."}
 
@@ -67,6 +97,7 @@ def transaction():
         amount = request.POST.get("amount")
         private_key = request.POST.get("private_key")
         data = request.POST.get("data")
+        fee = request.POST.get("fee") or 0
 
         if not t_from or not t_to or not amount or not private_key:
             if private_key:
@@ -75,10 +106,11 @@ def transaction():
 
         try:
             amount = float(amount)
+            fee = float(fee)
         except TypeError:
             raise TypeError("Invalid amount. Expected float")
 
-        tx = pth.send_pth(t_from, t_to, amount, private_key, data=data)
+        tx = pth.send_pth(t_from, t_to, amount, private_key, data=data, fee=fee)
         return {"status_code": 200, "transaction": tx}
     except Exception as tx:
         response.status = 400
@@ -140,6 +172,30 @@ def call_contract():
                                                                        f"contract. ERROR: {str(e)}"}
 
 
+@get('/get_emits')
+@get('/get_emits/<cxid>')
+def get_emits(cxid=None):
+    if not cxid:
+        cxid = request.query.get("contract_id")
+    if not cxid:
+        response.status = 400
+        return {"status_code": 400, "emits": None, "message": "No contract_id passed"}
+    try:
+        query = {}
+        for name in ("from_block", "to_block", "limit", "cursor"):
+            value = request.query.get(name)
+            if value:
+                query[name] = int(value)
+        for name in ("contains", "prefix"):
+            value = request.query.decode().get(name)
+            if value:
+                query[name] = value
+        return {"status_code": 200, "contract_id": cxid, **pth.query_emits(cxid, **query)}
+    except (ValueError, AssertionError) as e:
+        response.status = 400
+        return {"status_code": 400, "emits": None, "message": f"Malformed query. {str(e)}"}
+
+
 @get('/mempool')
 @get('/mempool/<mem_type>')
 def mempool(mem_type=None):
@@ -154,9 +210,33 @@ def mempool(mem_type=None):
     return {"status_code": 200, mem_type: pth.get_mempool(mem_type)}
 
 
+@get('/get_mempool_stats')
+def get_mempool_stats():
+    return {"status_code": 200, **pth.mempool_stats}
+
+
+def _flag(name):
+    # Flags of POST handlers are read from the form, or from the query string as before
+    value = request.POST.get(name) or request.query.get(name) or ""
+    return value.lower() in ("1", "true", "yes")
+
+
 @post('/validate')
 def validate():
-    return {"status_code": 200, **pth.verify_chain()}
+    full = _flag("full")
+    if _flag("wait"):
+        return {"status_code": 200, **pth.verify_chain(full=full)}
+    response.status = 202
+    return {"status_code": 202, **pth.start_validation(full=full)}
+
+
+@get('/validate/<job_id>')
+def validation_status(job_id):
+    status = pth.get_validation(job_id)
+    if status is None:
+        response.status = 404
+        return {"status_code": 404, "job_id": job_id, "message": "Validation job not found"}
+    return {"status_code": 200, **status}
 
 
 @error(404)
@@ -2,11 +2,48 @@ import time
 import hashlib
 from typing import List
 
+from pythereum import codec
 from pythereum.transaction import Transaction, Contract, Message
 
+# Version 1 (no version field in the header) hashes number, time, nonce, previous hash and merkle roots.
+# Version 2 moves the nonce to the end so the rest of the header can be hashed once while mining.
+# Version 3 builds merkle roots over raw 32 byte digests instead of hex strings.
+BLOCK_VERSION = 3
+
+
+def merkle_mode(version):
+    return "binary" if version >= 3 else "hex"
+
+
+def header_prefix(version, number, block_time, previous_block_hash, merkle_tx, merkle_cx, merkle_mx):
+    """
+    :return: (prefix, suffix) strings hashed around the nonce for the given header layout version
+    """
+    if version == 1:
+        return f"{number}{block_time}", f"{previous_block_hash}{merkle_tx}{merkle_cx}{merkle_mx}"
+    return f"{number}{block_time}{previous_block_hash}{merkle_tx}{merkle_cx}{merkle_mx}", ""
+
+
+def hash_header(header):
+    """
+    Hash of a jsonified block header, for any header layout version
+    """
+    merkle_roots = header["merkle_root"]
+    prefix, suffix = header_prefix(header.get("version", 1), header["block_number"], header["block_time"],
+                                   header["previous_block_hash"], merkle_roots["transactions"],
+                                   merkle_roots["contracts"], merkle_roots["messages"])
+    return hashlib.sha256(f"{prefix}{header['block_nonce']}{suffix}".encode()).hexdigest()
+
 
 class MerkleTree:
-    def __init__(self, *leaves):
+    def __init__(self, *leaves, mode="hex"):
+        """
+        :param leaves: Leaf ids (hex digests)
+        :param mode: "hex" hashes the concatenated hex strings of two nodes (blocks before version 3),
+                     "binary" hashes the concatenated raw 32 byte digests
+        """
+        assert mode in ("hex", "binary"), f"Unknown merkle mode {mode}"
+        self.__mode = mode
         self.__leaves = list(leaves)
         self.__levels = None
         self.ready = False
@@ -38,88 +75,201 @@ class MerkleTree:
     def ready_state(self):
         return self.ready
 
+    @property
+    def mode(self):
+        return self.__mode
+
     @property
     def root(self):
-        return self.__levels[0][0] if self.ready_state and self.__levels else None
+        if not self.ready_state or not self.__levels:
+            return None
+        if self.__mode == "binary":
+            return self.__levels[-1].hex()
+        return self.__levels[-1][0]
 
     def make_tree(self):
-        if len(self):
+        if len(self) and self.__mode == "binary":
+            self.__make_binary_tree()
+        elif len(self):
+            # Levels are stored leaves first
             self.__levels = [self.__leaves]
-            while len(self.__levels[0]) > 1:
-                n = len(self.__levels[0])
-                if n % 2:
-                    solo_leaf = self.__levels[0][-1]
-                    n -= 1
-                else:
-                    solo_leaf = None
-                new_level = []
-                for left, right in zip(self.__levels[0][0:n:2], self.__levels[0][1:n:2]):
-                    new_level.append(hashlib.sha256(f"{left}{right}".encode()).hexdigest())
-                if solo_leaf:
-                    new_level.append(solo_leaf)
-                self.__levels = [new_level] + self.__levels
+            while len(self.__levels[-1]) > 1:
+                level = self.__levels[-1]
+                n = len(level) - len(level) % 2
+                new_level = [hash_pair(left, right) for left, right in zip(level[0:n:2], level[1:n:2])]
+                if len(level) % 2:
+                    new_level.append(level[-1])
+                self.__levels.append(new_level)
             self.ready = True
 
+    def __make_binary_tree(self):
+        # Each level is one bytes object of concatenated 32 byte digests, so a pair of nodes is a 64 byte slice
+        sha256 = hashlib.sha256
+        level = bytes.fromhex("".join(self.__leaves))
+        self.__levels = [level]
+        while len(level) > 32:
+            paired = len(level) - len(level) % 64
+            level = b"".join([sha256(level[i:i + 64]).digest() for i in range(0, paired, 64)]) + level[paired:]
+            self.__levels.append(level)
+        self.ready = True
+
+
+class MerkleAccumulator:
+    """
+    Merkle tree that is built one leaf at a time, giving the same root as MerkleTree for the same leaves.
+
+    Every level is kept, so appending a leaf only rehashes the path from that leaf to the root and inclusion
+    proofs are read straight from the cached levels, both in O(log n).
+    """
+
+    def __init__(self, *leaves, mode="hex"):
+        assert mode in ("hex", "binary"), f"Unknown merkle mode {mode}"
+        self.__binary = mode == "binary"
+        self.__hash_pair = hash_pair_binary if self.__binary else hash_pair
+        self.__levels = [[]]
+        for leaf in leaves:
+            self.append(leaf)
+
+    def __len__(self):
+        return len(self.__levels[0])
+
+    @property
+    def mode(self):
+        return "binary" if self.__binary else "hex"
+
+    @property
+    def root(self):
+        if not self.__levels[0]:
+            return None
+        return self.__levels[-1][0].hex() if self.__binary else self.__levels[-1][0]
+
+    def append(self, leaf):
+        self.__levels[0].append(bytes.fromhex(leaf) if self.__binary else leaf)
+        index = len(self.__levels[0]) - 1
+        level = 0
+        while len(self.__levels[level]) > 1:
+            nodes = self.__levels[level]
+            index //= 2
+            if 2 * index + 1 < len(nodes):
+                parent = self.__hash_pair(nodes[2 * index], nodes[2 * index + 1])
+            else:
+                # A node without a sibling moves up unchanged
+                parent = nodes[2 * index]
+            if level + 1 == len(self.__levels):
+                self.__levels.append([])
+            if index < len(self.__levels[level + 1]):
+                self.__levels[level + 1][index] = parent
+            else:
+                self.__levels[level + 1].append(parent)
+            level += 1
+
+    def proof(self, index):
+        """
+        :param index: Position of the leaf
+        :return: list of (side, hash) pairs from the leaf up to the root, side being the side of the sibling
+        """
+        assert 0 <= index < len(self), f"Leaf {index} not in tree"
+        proof = []
+        for nodes in self.__levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(nodes):
+                proof.append(("left" if sibling < index else "right",
+                              nodes[sibling].hex() if self.__binary else nodes[sibling]))
+            index //= 2
+        return proof
+
+
+def hash_pair(left, right):
+    return hashlib.sha256(f"{left}{right}".encode()).hexdigest()
+
+
+def hash_pair_binary(left, right):
+    return hashlib.sha256(left + right).digest()
+
+
+def verify_merkle_proof(leaf, proof, root, mode="hex"):
+    """
+    Check that leaf is part of the Merkle tree with the given root, without the rest of the leaves
+
+    :param leaf: Transaction, contract or message id
+    :param proof: Proof returned by MerkleAccumulator.proof / Pythereum.get_transaction_proof
+    :param root: Merkle root from the block header
+    :param mode: Merkle mode of the block, see merkle_mode()
+    :return: bool indicating if the proof is valid
+    """
+    if mode == "binary":
+        node = bytes.fromhex(leaf)
+        for side, sibling in proof:
+            sibling = bytes.fromhex(sibling)
+            node = hash_pair_binary(sibling, node) if side == "left" else hash_pair_binary(node, sibling)
+        return node.hex() == root
+    node = leaf
+    for side, sibling in proof:
+        node = hash_pair(sibling, node) if side == "left" else hash_pair(node, sibling)
+    return node == root
+
 
 class Block:
     def __init__(self, *, block_number, block_nonce, previous_block_hash,
                  transactions: List[Transaction]=None,
                  contracts: List[Contract]=None,
-                 messages: List[Message]=None):
+                 messages: List[Message]=None,
+                 version=BLOCK_VERSION):
+        self.__version = int(version)
         self.__number = int(block_number)
         self.__time = time.time()
         self.__nonce = str(block_nonce)
         self.__previous_block_hash = previous_block_hash
 
-        if transactions:
-            if not isinstance(transactions, list):
-                transactions = [transactions]
-            for i, tx in enumerate(transactions):
-                if isinstance(tx, Transaction):
-                    transactions[i] = tx.jsonify()
+        self.__transactions = None
+        self.__contracts = None
+        self.__messages = None
+        self.__merkle_tx = MerkleAccumulator(mode=merkle_mode(self.__version))
+        self.__merkle_cx = MerkleAccumulator(mode=merkle_mode(self.__version))
+        self.__merkle_mx = MerkleAccumulator(mode=merkle_mode(self.__version))
+
+        for tx in (transactions if isinstance(transactions, list) else [transactions] if transactions else []):
+            self.add_transaction(tx)
+        for cx in (contracts if isinstance(contracts, list) else [contracts] if contracts else []):
+            self.add_contract(cx)
+        for mx in (messages if isinstance(messages, list) else [messages] if messages else []):
+            self.add_message(mx)
+
+        self.__block_hash: str = self.__hash_header()
+
+    def add_transaction(self, transaction):
+        if isinstance(transaction, Transaction):
+            transaction = transaction.jsonify()
+        if self.__transactions is None:
             self.__transactions = {}
-            for tx in transactions:
-                self.__transactions[tx["txid"]] = tx
-            merkle_tx = MerkleTree(*list(self.__transactions.keys()))
-            merkle_tx.make_tree()
-            self.__merkle_tx = merkle_tx.root
-        else:
-            self.__transactions = None
-            self.__merkle_tx = None
-
-        if contracts:
-            if not isinstance(contracts, list):
-                contracts = [contracts]
-            for i, cx in enumerate(contracts):
-                if isinstance(cx, Contract):
-                    contracts[i] = cx.jsonify()
+        if transaction["txid"] not in self.__transactions:
+            self.__merkle_tx.append(transaction["txid"])
+        self.__transactions[transaction["txid"]] = transaction
+        self.update_hash()
+
+    def add_contract(self, contract):
+        if isinstance(contract, Contract):
+            contract = contract.jsonify()
+        if self.__contracts is None:
             self.__contracts = {}
-            for cx in contracts:
-                self.__contracts[cx["cxid"]] = cx
-            merkle_cx = MerkleTree(*list(self.__contracts.keys()))
-            merkle_cx.make_tree()
-            self.__merkle_cx = merkle_cx.root
-        else:
-            self.__contracts = None
-            self.__merkle_cx = None
-
-        if messages:
-            if not isinstance(messages, list):
-                messages = [messages]
+        if contract["cxid"] not in self.__contracts:
+            self.__merkle_cx.append(contract["cxid"])
+        self.__contracts[contract["cxid"]] = contract
+        self.update_hash()
+
+    def add_message(self, message):
+        if isinstance(message, Message):
+            message = message.jsonify()
+        if self.__messages is None:
             self.__messages = {}
-            for mx in messages:
-                self.__messages[mx["mxid"]] = mx
-            merkle_mx = MerkleTree(*list(self.__messages.keys()))
-            merkle_mx.make_tree()
-            self.__merkle_mx = merkle_mx.root
-        else:
-            self.__messages = None
-            self.__merkle_mx = None
-
-        self.__block_hash: str = hashlib.sha256(
-            f"{self.number}{self.time}{self.nonce}{self.previous_block_hash}"
-            f"{self.__merkle_tx}{self.__merkle_cx}{self.__merkle_mx}".encode()
-        ).hexdigest()
+        if message["mxid"] not in self.__messages:
+            self.__merkle_mx.append(message["mxid"])
+        self.__messages[message["mxid"]] = message
+        self.update_hash()
+
+    @property
+    def version(self):
+        return self.__version
 
     @property
     def number(self):
@@ -161,21 +311,41 @@ class Block:
     def hash(self):
         return self.__block_hash
 
+    def header_prefix(self):
+        """
+        :return: (prefix, suffix) strings the nonce is hashed between, see header_prefix()
+        """
+        return header_prefix(self.version, self.number, self.time, self.previous_block_hash,
+                             self.__merkle_tx.root, self.__merkle_cx.root, self.__merkle_mx.root)
+
+    def __hash_header(self):
+        prefix, suffix = self.header_prefix()
+        return hashlib.sha256(f"{prefix}{self.nonce}{suffix}".encode()).hexdigest()
+
     def update_hash(self):
-        self.__block_hash = hashlib.sha256(
-            f"{self.number}{self.time}{self.nonce}{self.previous_block_hash}"
-            f"{self.__merkle_tx}{self.__merkle_cx}{self.__merkle_mx}".encode()
-        ).hexdigest()
+        self.__block_hash = self.__hash_header()
 
     def merkle_root(self, mtype):
         if mtype == "transactions":
-            return self.__merkle_tx
+            return self.__merkle_tx.root
         elif mtype == "contracts":
-            return self.__merkle_cx
+            return self.__merkle_cx.root
         elif mtype == "messages":
-            return self.__merkle_mx
+            return self.__merkle_mx.root
         return None
 
+    def merkle_proof(self, mtype, item_id):
+        """
+        :return: inclusion proof of a transaction, contract or message id in the block, see MerkleAccumulator.proof
+        """
+        items = {"transactions": self.__transactions, "contracts": self.__contracts,
+                 "messages": self.__messages}.get(mtype) or {}
+        if item_id not in items:
+            return None
+        accumulator = {"transactions": self.__merkle_tx, "contracts": self.__merkle_cx,
+                       "messages": self.__merkle_mx}[mtype]
+        return accumulator.proof(list(items).index(item_id))
+
     def __str__(self) -> str:
         return self.hash
 
@@ -183,18 +353,21 @@ class Block:
         return self.hash == other_block.hash
 
     def jsonify(self):
+        header = {
+            "block_number": self.number,
+            "block_time": self.time,
+            "block_nonce": self.nonce,
+            "previous_block_hash": self.previous_block_hash,
+            "merkle_root": {
+                "transactions": self.merkle_root("transactions"),
+                "contracts": self.merkle_root("contracts"),
+                "messages": self.merkle_root("messages")
+            }
+        }
+        if self.version > 1:
+            header["version"] = self.version
         return {
-            "header": {
-                "block_number": self.number,
-                "block_time": self.time,
-                "block_nonce": self.nonce,
-                "previous_block_hash": self.previous_block_hash,
-                "merkle_root": {
-                    "transactions": self.merkle_root("transactions"),
-                    "contracts": self.merkle_root("contracts"),
-                    "messages": self.merkle_root("messages")
-                }
-            },
+            "header": header,
             "data": {
                 "transactions": self.transactions,
                 "contracts": self.contracts,
@@ -203,8 +376,8 @@ class Block:
             "block_hash": self.hash
         }
 
+    def encode(self):
+        return codec.encode_block(self.jsonify())
+
     def validate(self) -> bool:
-        return hashlib.sha256(
-            f"{self.number}{self.time}{self.nonce}{self.previous_block_hash}"
-            f"{self.__merkle_tx}{self.__merkle_cx}{self.__merkle_mx}".encode()
-        ).hexdigest() == self.hash
+        return self.__hash_header() == self.hash
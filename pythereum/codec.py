@@ -0,0 +1,234 @@
+"""
+Compact binary encoding of blocks, transactions, contracts and messages.
+
+The encoding mirrors the dictionaries produced by jsonify() value for value, so decoding gives back the exact
+JSON shape. Every encoded item starts with a format version and the kind of item, followed by one tagged value:
+
+- hashes (64 character lowercase hex strings) are stored as their raw 32 bytes
+- base64 strings (addresses, signatures) are stored as their raw bytes
+- integers are zigzag varints, floats are 8 byte IEEE doubles
+- dictionary keys that are known field names are stored as a one byte reference into FIELD_NAMES
+"""
+
+import struct
+import binascii
+
+VERSION = 1
+
+BLOCK = 1
+TRANSACTION = 2
+CONTRACT = 3
+MESSAGE = 4
+
+# Field names referenced by index. Only ever append to this tuple, existing indexes are part of the format.
+FIELD_NAMES = (
+    "header", "data", "block_hash", "block_number", "block_time", "block_nonce", "previous_block_hash",
+    "merkle_root", "transactions", "contracts", "messages", "from", "to", "time", "signature", "amount", "txid",
+    "input_txids", "change_from", "cxid", "code", "state", "state_vars", "emits", "gas", "mxid", "args", "reply",
+    "version", "fee", "fee_from", "signed_amount", "signature_version"
+)
+FIELD_INDEX = {name: i + 1 for i, name in enumerate(FIELD_NAMES)}
+
+T_NONE = 0x00
+T_FALSE = 0x01
+T_TRUE = 0x02
+T_INT = 0x03
+T_FLOAT = 0x04
+T_HASH = 0x05
+T_BASE64 = 0x06
+T_STR = 0x07
+T_LIST = 0x08
+T_DICT = 0x09
+
+DOUBLE = struct.Struct(">d")
+HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_str(out, s):
+    if len(s) == 64 and HEX_DIGITS.issuperset(s):
+        out.append(T_HASH)
+        out += bytes.fromhex(s)
+        return
+    if len(s) >= 16 and not len(s) % 4:
+        try:
+            raw = binascii.a2b_base64(s)
+            if binascii.b2a_base64(raw, newline=False).decode() == s:
+                out.append(T_BASE64)
+                _write_varint(out, len(raw))
+                out += raw
+                return
+        except (binascii.Error, ValueError):
+            pass
+    raw = s.encode("utf-8")
+    out.append(T_STR)
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _write_value(out, value):
+    if value is None:
+        out.append(T_NONE)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        out.append(T_INT)
+        _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out += DOUBLE.pack(value)
+    elif isinstance(value, str):
+        _write_str(out, value)
+    elif isinstance(value, (list, tuple)):
+        out.append(T_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _write_value(out, item)
+    elif isinstance(value, dict):
+        out.append(T_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            if key in FIELD_INDEX:
+                _write_varint(out, FIELD_INDEX[key])
+            else:
+                out.append(0)
+                _write_str(out, str(key))
+            _write_value(out, item)
+    else:
+        raise CodecError(f"Cannot encode value of type {type(value).__name__}")
+
+
+def _read_str(buf, pos, tag):
+    if tag == T_HASH:
+        return bytes(buf[pos:pos + 32]).hex(), pos + 32
+    length, pos = _read_varint(buf, pos)
+    raw = bytes(buf[pos:pos + length])
+    if tag == T_BASE64:
+        return binascii.b2a_base64(raw, newline=False).decode(), pos + length
+    return raw.decode("utf-8"), pos + length
+
+
+def _read_value(buf, pos):
+    tag = buf[pos]
+    pos += 1
+    if tag == T_NONE:
+        return None, pos
+    elif tag == T_TRUE:
+        return True, pos
+    elif tag == T_FALSE:
+        return False, pos
+    elif tag == T_INT:
+        n, pos = _read_varint(buf, pos)
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    elif tag == T_FLOAT:
+        return DOUBLE.unpack_from(buf, pos)[0], pos + DOUBLE.size
+    elif tag in (T_HASH, T_BASE64, T_STR):
+        return _read_str(buf, pos, tag)
+    elif tag == T_LIST:
+        n, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(n):
+            item, pos = _read_value(buf, pos)
+            items.append(item)
+        return items, pos
+    elif tag == T_DICT:
+        n, pos = _read_varint(buf, pos)
+        items = {}
+        for _ in range(n):
+            key_index, pos = _read_varint(buf, pos)
+            if key_index:
+                key = FIELD_NAMES[key_index - 1]
+            else:
+                key, pos = _read_str(buf, pos + 1, buf[pos])
+            items[key], pos = _read_value(buf, pos)
+        return items, pos
+    raise CodecError(f"Unknown value tag {tag:#x} at offset {pos - 1}")
+
+
+def encode(kind, item):
+    """
+    :param kind: BLOCK, TRANSACTION, CONTRACT or MESSAGE
+    :param item: JSON shape of the item (as returned by jsonify()) or the object itself
+    :return bytes: binary encoding of the item
+    """
+    if not isinstance(item, dict):
+        item = item.jsonify()
+    out = bytearray((VERSION, kind))
+    _write_value(out, item)
+    return bytes(out)
+
+
+def decode(kind, data):
+    """
+    :param kind: Kind of item expected in data
+    :param data: bytes produced by encode()
+    :return: the JSON shape of the item
+    """
+    if len(data) < 2:
+        raise CodecError("Truncated item")
+    if data[0] != VERSION:
+        raise CodecError(f"Unsupported encoding version {data[0]}")
+    if data[1] != kind:
+        raise CodecError(f"Expected item kind {kind}, got {data[1]}")
+    try:
+        item, pos = _read_value(data, 2)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise CodecError(f"Truncated or corrupted item: {e}")
+    if pos != len(data):
+        raise CodecError("Trailing bytes after item")
+    return item
+
+
+def encode_block(block):
+    return encode(BLOCK, block)
+
+
+def decode_block(data):
+    return decode(BLOCK, data)
+
+
+def encode_transaction(transaction):
+    return encode(TRANSACTION, transaction)
+
+
+def decode_transaction(data):
+    return decode(TRANSACTION, data)
+
+
+def encode_contract(contract):
+    return encode(CONTRACT, contract)
+
+
+def decode_contract(data):
+    return decode(CONTRACT, data)
+
+
+def encode_message(message):
+    return encode(MESSAGE, message)
+
+
+def decode_message(data):
+    return decode(MESSAGE, data)
@@ -0,0 +1,73 @@
+import math
+from collections import deque
+
+MAX_TARGET = 2 ** 256 - 1
+
+
+def target_from_difficulty(difficulty):
+    """
+    :param difficulty: Number of leading hex zeros a block hash needs, may be fractional
+    :return int: Largest block hash (as an integer) that meets the difficulty
+    """
+    difficulty = float(difficulty)
+    assert 0 <= difficulty <= 64, f"Invalid difficulty {difficulty}"
+    whole = int(difficulty)
+    return max(int((1 << (256 - 4 * whole)) / 16 ** (difficulty - whole)) - 1, 1)
+
+
+def difficulty_from_target(target):
+    difficulty = 64 - math.log2(target + 1) / 4
+    return int(difficulty) if difficulty.is_integer() else round(difficulty, 3)
+
+
+class Difficulty:
+    """
+    Numeric proof of work target: a block is valid when its hash, read as an integer, is no larger than the target.
+
+    When block_time is set the target is retargeted every retarget_interval blocks so that blocks take block_time
+    seconds on average, changing by at most a factor of max_adjustment at a time. Otherwise it stays fixed.
+    """
+
+    def __init__(self, difficulty=4, *, block_time=None, retarget_interval=10, max_adjustment=4):
+        self.__target = target_from_difficulty(difficulty)
+        self.__block_time = float(block_time) if block_time else None
+        self.__retarget_interval = int(retarget_interval)
+        self.__max_adjustment = float(max_adjustment)
+        assert self.__retarget_interval > 0, "Retarget interval must be positive"
+        assert self.__max_adjustment >= 1, "Max adjustment must be at least 1"
+        self.__times = deque(maxlen=self.__retarget_interval + 1)
+
+    @property
+    def target(self):
+        return self.__target
+
+    @property
+    def difficulty(self):
+        return difficulty_from_target(self.__target)
+
+    @property
+    def adaptive(self):
+        return self.__block_time is not None
+
+    def meets(self, block_hash):
+        return int(block_hash, 16) <= self.__target
+
+    def add_block(self, block):
+        if not self.adaptive:
+            return
+        header = block["header"]
+        self.__times.append(header["block_time"])
+        if header["block_number"] and not header["block_number"] % self.__retarget_interval \
+                and len(self.__times) == self.__times.maxlen:
+            self.retarget(self.__times[-1] - self.__times[0])
+
+    def retarget(self, elapsed):
+        """
+        Scale the target by how long the last retarget_interval blocks took compared to the expected time
+
+        :param elapsed: Seconds between the first and last block of the interval
+        """
+        expected = self.__block_time * self.__retarget_interval
+        factor = min(max(elapsed / expected, 1 / self.__max_adjustment), self.__max_adjustment)
+        numerator, denominator = factor.as_integer_ratio()
+        self.__target = min(max(self.__target * numerator // denominator, 1), MAX_TARGET)
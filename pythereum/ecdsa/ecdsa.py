@@ -108,7 +108,7 @@ class Public_key(object):
     c = numbertheory.inverse_mod(s, n)
     u1 = (hash * c) % n
     u2 = (r * c) % n
-    xy = u1 * G + u2 * self.point
+    xy = G.mul_add(u1, self.point, u2)
     v = xy.x() % n
     return v == r
 
@@ -217,7 +217,7 @@ _Gx = 0x188da80eb03090f67cbf20eb43a18800f4ff0afd82ff1012
 _Gy = 0x07192b95ffc8da78631011ed6b24cdd573f977a11e794811
 
 curve_192 = ellipticcurve.CurveFp(_p, -3, _b)
-generator_192 = ellipticcurve.Point(curve_192, _Gx, _Gy, _r)
+generator_192 = ellipticcurve.Point(curve_192, _Gx, _Gy, _r, generator=True)
 
 
 # NIST Curve P-224:
@@ -230,7 +230,7 @@ _Gx = 0xb70e0cbd6bb4bf7f321390b94a03c1d356c21122343280d6115c1d21
 _Gy = 0xbd376388b5f723fb4c22dfe6cd4375a05a07476444d5819985007e34
 
 curve_224 = ellipticcurve.CurveFp(_p, -3, _b)
-generator_224 = ellipticcurve.Point(curve_224, _Gx, _Gy, _r)
+generator_224 = ellipticcurve.Point(curve_224, _Gx, _Gy, _r, generator=True)
 
 # NIST Curve P-256:
 _p = 115792089210356248762697446949407573530086143415290314195533631308867097853951
@@ -242,7 +242,7 @@ _Gx = 0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296
 _Gy = 0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5
 
 curve_256 = ellipticcurve.CurveFp(_p, -3, _b)
-generator_256 = ellipticcurve.Point(curve_256, _Gx, _Gy, _r)
+generator_256 = ellipticcurve.Point(curve_256, _Gx, _Gy, _r, generator=True)
 
 # NIST Curve P-384:
 _p = 39402006196394479212279040100143613805079739270465446667948293404245721771496870329047266088258938001861606973112319
@@ -254,7 +254,7 @@ _Gx = 0xaa87ca22be8b05378eb1c71ef320ad746e1d3b628ba79b9859f741e082542a385502f25d
 _Gy = 0x3617de4a96262c6f5d9e98bf9292dc29f8f41dbd289a147ce9da3113b5f0b8c00a60b1ce1d7e819d7a431d7c90ea0e5f
 
 curve_384 = ellipticcurve.CurveFp(_p, -3, _b)
-generator_384 = ellipticcurve.Point(curve_384, _Gx, _Gy, _r)
+generator_384 = ellipticcurve.Point(curve_384, _Gx, _Gy, _r, generator=True)
 
 # NIST Curve P-521:
 _p = 6864797660130609714981900799081393217269435300143305409394463459185543183397656052122559640661454554977296311391480858037121987999716643812574028291115057151
@@ -266,7 +266,7 @@ _Gx = 0xc6858e06b70404e9cd9e3ecb662395b4429c648139053fb521f828af606b4d3dbaa14b5e
 _Gy = 0x11839296a789a3bc0045c8a5fb42c7d1bd998f54449579b446817afbd17273e662c97ee72995ef42640c550b9013fad0761353c7086a272c24088be94769fd16650
 
 curve_521 = ellipticcurve.CurveFp(_p, -3, _b)
-generator_521 = ellipticcurve.Point(curve_521, _Gx, _Gy, _r)
+generator_521 = ellipticcurve.Point(curve_521, _Gx, _Gy, _r, generator=True)
 
 # Certicom secp256-k1
 _a = 0x0000000000000000000000000000000000000000000000000000000000000000
@@ -277,4 +277,4 @@ _Gy = 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
 _r = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
 
 curve_secp256k1 = ellipticcurve.CurveFp(_p, _a, _b)
-generator_secp256k1 = ellipticcurve.Point(curve_secp256k1, _Gx, _Gy, _r)
+generator_secp256k1 = ellipticcurve.Point(curve_secp256k1, _Gx, _Gy, _r, generator=True)
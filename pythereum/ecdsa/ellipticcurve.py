@@ -66,12 +66,18 @@ class CurveFp(object):
 class Point(object):
   """A point on an elliptic curve. Altering x and y is forbidding,
      but they can be read by the x() and y() methods."""
-  def __init__(self, curve, x, y, order=None):
-    """curve, x, y, order; order (optional) is the order of this point."""
+  def __init__(self, curve, x, y, order=None, generator=False):
+    """curve, x, y, order; order (optional) is the order of this point.
+    generator (optional) marks a point that is multiplied often, such as
+    the base point of a curve: a WindowTable for it is built on the
+    first multiplication and used by every later one."""
     self.__curve = curve
     self.__x = x
     self.__y = y
     self.__order = order
+    self.__generator = generator
+    self.__table = None
+    self.__odd_multiples = {}
     # self.curve is allowed to be None only for INFINITY:
     if self.__curve:
       assert self.__curve.contains_point(x, y)
@@ -116,13 +122,6 @@ class Point(object):
   def __mul__(self, other):
     """Multiply a point by an integer."""
 
-    def leftmost_bit(x):
-      assert x > 0
-      result = 1
-      while result <= x:
-        result = 2 * result
-      return result // 2
-
     e = other
     if self.__order:
       e = e % self.__order
@@ -132,23 +131,45 @@ class Point(object):
       return INFINITY
     assert e > 0
 
-    # From X9.62 D.3.2:
+    if self.__generator:
+      return self.precompute().multiply(e).to_affine()
 
-    e3 = 3 * e
-    negative_self = Point(self.__curve, self.__x, -self.__y, self.__order)
-    i = leftmost_bit(e3) // 2
-    result = self
-    # print_("Multiplying %s by %d (e3 = %d):" % (self, other, e3))
-    while i > 1:
-      result = result.double()
-      if (e3 & i) != 0 and (e & i) == 0:
-        result = result + self
-      if (e3 & i) == 0 and (e & i) != 0:
-        result = result + negative_self
-      # print_(". . . i = %d, result = %s" % ( i, result ))
-      i = i // 2
+    # Work in Jacobian coordinates and only invert once, at the end:
+    return (PointJacobi.from_affine(self) * e).to_affine()
 
-    return result
+  def precompute(self):
+    """Return the WindowTable of this point, building it if needed."""
+    if self.__table is None:
+      self.__table = WindowTable(self, self.__order)
+    return self.__table
+
+  def odd_multiples(self, width=4):
+    """Return the odd multiples of this point used by mul_add. They are
+       kept on the point, so a public key verifying many signatures only
+       computes them once."""
+    if width not in self.__odd_multiples:
+      self.__odd_multiples[width] = odd_multiples(
+        PointJacobi.from_affine(self), width)
+    return self.__odd_multiples[width]
+
+  def mul_add(self, e1, other, e2):
+    """Return self * e1 + other * e2.
+
+    Both products are computed together with Straus' method, sharing one
+    chain of doublings, and converted to affine once."""
+    if self.__order:
+      e1 = e1 % self.__order
+    if other.order():
+      e2 = e2 % other.order()
+    if e1 == 0 or self == INFINITY:
+      return other * e2
+    if e2 == 0 or other == INFINITY:
+      return self * e1
+    assert e1 > 0 and e2 > 0
+    # Generators keep a wider window, their table is only built once:
+    width = 6 if self.__generator else 4
+    return straus([(e1, self.odd_multiples(width)),
+                   (e2, other.odd_multiples(4))]).to_affine()
 
   def __rmul__(self, other):
     """Multiply a point by an integer."""
@@ -195,3 +216,266 @@ class Point(object):
 # This one point is the Point At Infinity for all purposes:
 INFINITY = Point(None, None, None)
 
+
+def leftmost_bit(x):
+  assert x > 0
+  result = 1
+  while result <= x:
+    result = 2 * result
+  return result // 2
+
+
+class PointJacobi(object):
+  """A point on an elliptic curve in Jacobian coordinates: (X, Y, Z)
+     stands for the affine point (X/Z^2, Y/Z^3), and Z == 0 for the
+     point at infinity. Adding and doubling need no modular inversion,
+     so scalar multiplication works on these and converts back to an
+     affine Point once, with to_affine()."""
+  def __init__(self, curve, x, y, z):
+    self.__curve = curve
+    self.__x = x
+    self.__y = y
+    self.__z = z
+
+  @classmethod
+  def from_affine(cls, point):
+    if point == INFINITY:
+      return cls(None, 0, 1, 0)
+    return cls(point.curve(), point.x(), point.y(), 1)
+
+  def to_affine(self):
+    """Return the affine Point, without order, for this point."""
+    if self.is_infinity():
+      return INFINITY
+    p = self.__curve.p()
+    z_inv = numbertheory.inverse_mod(self.__z, p)
+    z_inv2 = z_inv * z_inv % p
+    return Point(self.__curve, self.__x * z_inv2 % p,
+                 self.__y * z_inv2 * z_inv % p)
+
+  def is_infinity(self):
+    return self.__z == 0
+
+  def x(self):
+    return self.__x
+
+  def y(self):
+    return self.__y
+
+  def z(self):
+    return self.__z
+
+  def curve(self):
+    return self.__curve
+
+  def __neg__(self):
+    if self.is_infinity():
+      return self
+    return PointJacobi(self.__curve, self.__x,
+                       -self.__y % self.__curve.p(), self.__z)
+
+  def double(self):
+    """Return a new point that is twice the old."""
+
+    if self.is_infinity() or self.__y == 0:
+      return PointJacobi(None, 0, 1, 0)
+
+    # dbl-2007-bl from the Explicit-Formulas Database:
+
+    p = self.__curve.p()
+    a = self.__curve.a()
+    X1, Y1, Z1 = self.__x, self.__y, self.__z
+
+    XX = X1 * X1 % p
+    YY = Y1 * Y1 % p
+    YYYY = YY * YY % p
+    ZZ = Z1 * Z1 % p
+    S = 2 * ((X1 + YY) ** 2 - XX - YYYY) % p
+    M = (3 * XX + a * ZZ * ZZ) % p
+    X3 = (M * M - 2 * S) % p
+    Y3 = (M * (S - X3) - 8 * YYYY) % p
+    Z3 = ((Y1 + Z1) ** 2 - YY - ZZ) % p
+
+    return PointJacobi(self.__curve, X3, Y3, Z3)
+
+  def __add__(self, other):
+    """Add one point to another point."""
+
+    if other.is_infinity():
+      return self
+    if self.is_infinity():
+      return other
+    assert self.__curve == other.__curve
+
+    # add-2007-bl from the Explicit-Formulas Database, with the Z2 == 1
+    # multiplications left out when other is still affine:
+
+    p = self.__curve.p()
+    X1, Y1, Z1 = self.__x, self.__y, self.__z
+    X2, Y2, Z2 = other.__x, other.__y, other.__z
+
+    Z1Z1 = Z1 * Z1 % p
+    U2 = X2 * Z1Z1 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    if Z2 == 1:
+      U1, S1 = X1, Y1
+    else:
+      Z2Z2 = Z2 * Z2 % p
+      U1 = X1 * Z2Z2 % p
+      S1 = Y1 * Z2 * Z2Z2 % p
+    H = (U2 - U1) % p
+    r = (S2 - S1) % p
+    if H == 0:
+      if r == 0:
+        return self.double()
+      return PointJacobi(None, 0, 1, 0)
+
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - S1 * HHH) % p
+    Z3 = Z1 * H % p if Z2 == 1 else Z1 * Z2 * H % p
+
+    return PointJacobi(self.__curve, X3, Y3, Z3)
+
+  def __mul__(self, e):
+    """Multiply a point by a positive integer."""
+
+    assert e > 0
+    if self.is_infinity():
+      return self
+
+    # From X9.62 D.3.2, as in Point.__mul__:
+
+    e3 = 3 * e
+    negative_self = -self
+    i = leftmost_bit(e3) // 2
+    result = self
+    while i > 1:
+      result = result.double()
+      if (e3 & i) != 0 and (e & i) == 0:
+        result = result + self
+      if (e3 & i) == 0 and (e & i) != 0:
+        result = result + negative_self
+      i = i // 2
+
+    return result
+
+  def __rmul__(self, other):
+    """Multiply a point by an integer."""
+
+    return self * other
+
+
+def normalize(points):
+  """Return the PointJacobi points with Z == 1, using a single modular
+     inversion for all of them (Montgomery's trick). Points at infinity
+     are returned as they are."""
+  finite = [q for q in points if not q.is_infinity()]
+  if not finite:
+    return list(points)
+  p = finite[0].curve().p()
+  prefix = [1]
+  for q in finite:
+    prefix.append(prefix[-1] * q.z() % p)
+  inverse = numbertheory.inverse_mod(prefix[-1], p)
+  normalized = [None] * len(finite)
+  for i in range(len(finite) - 1, -1, -1):
+    z_inv = inverse * prefix[i] % p
+    inverse = inverse * finite[i].z() % p
+    z_inv2 = z_inv * z_inv % p
+    normalized[i] = PointJacobi(finite[i].curve(), finite[i].x() * z_inv2 % p,
+                                finite[i].y() * z_inv2 * z_inv % p, 1)
+  normalized.reverse()
+  return [q if q.is_infinity() else normalized.pop() for q in points]
+
+
+def wnaf(e, width):
+  """Return the width-w non-adjacent form of e > 0, least significant
+     digit first: every digit is 0 or odd and below 2^(width-1) in
+     absolute value, and any w consecutive digits hold at most one
+     non-zero digit."""
+  digits = []
+  full = 1 << width
+  half = full >> 1
+  while e:
+    if e & 1:
+      digit = e & (full - 1)
+      if digit >= half:
+        digit -= full
+      e -= digit
+    else:
+      digit = 0
+    digits.append(digit)
+    e >>= 1
+  return digits
+
+
+def odd_multiples(point, width):
+  """Return [P, 3P, 5P, ..., (2^(width-1) - 1)P] for the PointJacobi P,
+     normalized for mixed additions."""
+  twice = point.double()
+  multiples = [point]
+  for _ in range(2 ** (width - 2) - 1):
+    multiples.append(multiples[-1] + twice)
+  return normalize(multiples)
+
+
+def straus(terms):
+  """Return the sum of e * P over terms, a list of (e, odd_multiples(P))
+     pairs, as a PointJacobi.
+
+  Straus' method: the wNAFs of all multipliers are walked together from
+  the most significant digit, so every product shares one chain of
+  doublings."""
+  nafs = [(wnaf(e, len(multiples).bit_length() + 1), multiples)
+          for e, multiples in terms]
+  result = PointJacobi(None, 0, 1, 0)
+  for i in range(max(len(naf) for naf, _ in nafs) - 1, -1, -1):
+    result = result.double()
+    for naf, multiples in nafs:
+      if i < len(naf) and naf[i]:
+        digit = naf[i]
+        if digit > 0:
+          result = result + multiples[digit // 2]
+        else:
+          result = result + -multiples[-digit // 2]
+  return result
+
+
+class WindowTable(object):
+  """Fixed-base multiples of a point for fast scalar multiplication.
+
+  The multiplier is cut into windows of width bits. For window i the
+  table holds d * 2^(width*i) * point for every digit d, in affine form,
+  so a multiplication is one mixed addition per non-zero window and no
+  doublings at all."""
+  def __init__(self, point, order, width=4):
+    """order bounds the multipliers the table is used for."""
+    self.__width = width
+    self.__order = order
+    rows = []
+    base = PointJacobi.from_affine(point)
+    for _ in range((order.bit_length() + width - 1) // width):
+      row = [base]
+      for _ in range(2 ** width - 2):
+        row.append(row[-1] + base)
+      rows.append(row)
+      base = row[-1] + base
+    # Converting to affine keeps the later additions cheap:
+    points = normalize([q for row in rows for q in row])
+    size = 2 ** width - 1
+    self.__table = [points[i:i + size] for i in range(0, len(points), size)]
+
+  def multiply(self, e):
+    """Return e * point as a PointJacobi, for 0 < e < order."""
+    assert 0 < e < self.__order
+    mask = 2 ** self.__width - 1
+    result = PointJacobi(None, 0, 1, 0)
+    for row in self.__table:
+      digit = e & mask
+      if digit:
+        result = result + row[digit - 1]
+      e >>= self.__width
+    return result
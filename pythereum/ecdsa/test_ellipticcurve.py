@@ -109,3 +109,76 @@ def test_ellipticcurve():
     raise FailedTest("u1 * p192 + u2 * Q came out wrong.")
   else:
     print_("u1 * p192 + u2 * Q came out right.")
+
+
+def test_jacobi_matches_affine():
+  from random import Random
+  from pythereum.ecdsa.ecdsa import generator_192, generator_secp256k1
+  from pythereum.ecdsa.ellipticcurve import PointJacobi
+
+  def affine_multiply(point, e):
+    """Double and add with the affine Point arithmetic only."""
+    result = INFINITY
+    for bit in bin(e)[2:]:
+      result = result.double()
+      if bit == "1":
+        result = result + point
+    return result
+
+  rng = Random(0)
+  c = CurveFp(23, 1, 1)
+  for m in range(1, 40):
+    assert Point(c, 13, 7) * m == affine_multiply(Point(c, 13, 7), m)
+
+  for g in (generator_192, generator_secp256k1):
+    for _ in range(20):
+      m = rng.randrange(1, g.order())
+      expected = affine_multiply(g, m)
+      assert g * m == expected
+      assert (PointJacobi.from_affine(g) * m).to_affine() == expected
+      other = g * rng.randrange(1, g.order())
+      jacobi_sum = PointJacobi.from_affine(g) * m + PointJacobi.from_affine(other)
+      assert jacobi_sum.to_affine() == expected + other
+      assert (PointJacobi.from_affine(g) * m).double().to_affine() == expected.double()
+    assert (PointJacobi.from_affine(g) * g.order()).to_affine() == INFINITY
+
+
+def test_generator_table_matches_plain_multiply():
+  from random import Random
+  from pythereum.ecdsa.curves import curves
+  from pythereum.ecdsa.ellipticcurve import WindowTable
+
+  rng = Random(1)
+  for curve in curves:
+    g = curve.generator
+    plain = Point(g.curve(), g.x(), g.y(), g.order())
+    for m in [1, 2, 15, 16, 17, g.order() - 1] + \
+             [rng.randrange(1, g.order()) for _ in range(10)]:
+      assert g * m == plain * m
+    assert g * g.order() == INFINITY
+    narrow = WindowTable(plain, g.order(), width=2)
+    m = rng.randrange(1, g.order())
+    assert narrow.multiply(m).to_affine() == plain * m
+
+
+def test_mul_add_matches_separate_multiplies():
+  from random import Random
+  from pythereum.ecdsa.curves import curves
+  from pythereum.ecdsa.ellipticcurve import wnaf
+
+  rng = Random(2)
+  for e in [0, 1, 7, 8, 255, 256, rng.getrandbits(256)]:
+    for width in (2, 4, 6):
+      digits = wnaf(e, width)
+      assert sum(d << i for i, d in enumerate(digits)) == e
+      assert all(d == 0 or (d % 2 and abs(d) < 1 << (width - 1)) for d in digits)
+
+  for curve in curves:
+    g = curve.generator
+    n = g.order()
+    q = g * rng.randrange(1, n)
+    for u1, u2 in [(0, 0), (0, 5), (5, 0), (1, 1), (n - 1, 1), (n, n + 3)] + \
+                  [(rng.randrange(1, n), rng.randrange(1, n)) for _ in range(5)]:
+      assert g.mul_add(u1, q, u2) == g * u1 + q * u2
+    assert g.mul_add(3, INFINITY, 5) == g * 3
+    assert g.mul_add(1, g * (n - 1), 1) == INFINITY
@@ -0,0 +1,322 @@
+from bisect import bisect_left, bisect_right
+
+
+class UTXOSet:
+    """
+    Unspent transaction outputs, keyed by txid and indexed by owner address.
+    Kept up to date by feeding it every block appended to the chain, in order.
+    """
+
+    def __init__(self):
+        self.__outputs = {}  # txid => output
+        self.__by_owner = {}  # public_key => {txid: output}
+
+    def __len__(self):
+        return len(self.__outputs)
+
+    def __contains__(self, txid):
+        return txid in self.__outputs
+
+    def get(self, txid):
+        return self.__outputs.get(txid)
+
+    def clear(self):
+        self.__outputs.clear()
+        self.__by_owner.clear()
+
+    def snapshot(self):
+        return {"outputs": list(self.__outputs.values())}
+
+    def restore(self, state):
+        self.clear()
+        for output in state["outputs"]:
+            output = {"txid": output["txid"], "owner": output["owner"], "amount": output["amount"],
+                      "block_number": output["block_number"], "position": output["position"]}
+            self.__outputs[output["txid"]] = output
+            self.__by_owner.setdefault(output["owner"], {})[output["txid"]] = output
+
+    def add_block(self, block):
+        transactions = block["data"]["transactions"]
+        if not transactions:
+            return
+        block_number = block["header"]["block_number"]
+
+        # Register every output first so the result does not depend on the order of transactions in a block
+        for position, (txid, tx) in enumerate(transactions.items()):
+            output = {"txid": txid, "owner": tx["to"], "amount": tx["amount"],
+                      "block_number": block_number, "position": position}
+            self.__outputs[txid] = output
+            self.__by_owner.setdefault(tx["to"], {})[txid] = output
+
+        for tx in transactions.values():
+            input_txids = tx["input_txids"]
+            if isinstance(input_txids, str):
+                input_txids = [input_txids]
+            for input_txid in input_txids:
+                output = self.__outputs.get(input_txid)
+                if output and output["owner"] == tx["from"]:
+                    self.__spend(output)
+
+    def __spend(self, output):
+        del self.__outputs[output["txid"]]
+        owned = self.__by_owner[output["owner"]]
+        del owned[output["txid"]]
+        if not owned:
+            del self.__by_owner[output["owner"]]
+
+    def outputs(self, public_key):
+        """
+        Unspent outputs owned by public_key, newest block first
+
+        :param public_key: Owner address
+        :return: list of output dictionaries -> {"txid", "owner", "amount", "block_number", "position"}
+        """
+        owned = self.__by_owner.get(public_key)
+        if not owned:
+            return []
+        return sorted(owned.values(), key=lambda output: (-output["block_number"], output["position"]))
+
+    def txids(self, public_key):
+        return [output["txid"] for output in self.outputs(public_key)]
+
+    def owners(self):
+        return list(self.__by_owner.keys())
+
+
+class TransactionIndex:
+    """
+    Location of every mined transaction: txid => (block number, position inside the block)
+    """
+
+    def __init__(self):
+        self.__locations = {}
+
+    def __len__(self):
+        return len(self.__locations)
+
+    def __contains__(self, txid):
+        return txid in self.__locations
+
+    def get(self, txid):
+        return self.__locations.get(txid)
+
+    def clear(self):
+        self.__locations.clear()
+
+    def snapshot(self):
+        return {"locations": self.__locations}
+
+    def restore(self, state):
+        self.__locations = {txid: (int(block_number), int(position))
+                            for txid, (block_number, position) in state["locations"].items()}
+
+    def add_block(self, block):
+        block_number = block["header"]["block_number"]
+        for position, txid in enumerate(block["data"]["transactions"] or {}):
+            self.__locations[txid] = (block_number, position)
+
+
+class BlockIndex:
+    """
+    Block number of every block on the chain, keyed by block hash
+    """
+
+    def __init__(self):
+        self.__numbers = {}
+
+    def __len__(self):
+        return len(self.__numbers)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.__numbers
+
+    def get(self, block_hash):
+        return self.__numbers.get(block_hash)
+
+    def clear(self):
+        self.__numbers.clear()
+
+    def snapshot(self):
+        return {"numbers": self.__numbers}
+
+    def restore(self, state):
+        self.__numbers = {block_hash: int(number) for block_hash, number in state["numbers"].items()}
+
+    def add_block(self, block):
+        self.__numbers[block["block_hash"]] = block["header"]["block_number"]
+
+
+class BalanceLedger:
+    """
+    Running balance of every address. Every checkpoint_interval blocks the balances that changed since the
+    previous checkpoint are recorded, so the balance as of an older block only needs to replay the blocks
+    after the closest checkpoint.
+    """
+
+    def __init__(self, checkpoint_interval=100):
+        self.__checkpoint_interval = int(checkpoint_interval)
+        assert self.__checkpoint_interval > 0, "Checkpoint interval must be positive"
+        self.__balances = {}
+        self.__changed = set()
+        self.__checkpoints = {}  # public_key => ([block_number, ...], [balance, ...])
+        self.__height = -1
+
+    @property
+    def checkpoint_interval(self):
+        return self.__checkpoint_interval
+
+    def clear(self):
+        self.__balances.clear()
+        self.__changed.clear()
+        self.__checkpoints.clear()
+        self.__height = -1
+
+    def snapshot(self):
+        return {"checkpoint_interval": self.__checkpoint_interval, "height": self.__height,
+                "balances": self.__balances, "changed": list(self.__changed), "checkpoints": self.__checkpoints}
+
+    def restore(self, state):
+        """
+        :raises ValueError: if the snapshot was taken with another checkpoint interval, its checkpoints would
+                            not line up with the ones this ledger looks up
+        """
+        if state["checkpoint_interval"] != self.__checkpoint_interval:
+            raise ValueError(f"Snapshot has checkpoint interval {state['checkpoint_interval']}, "
+                             f"expected {self.__checkpoint_interval}")
+        self.__height = int(state["height"])
+        self.__balances = dict(state["balances"])
+        self.__changed = set(state["changed"])
+        self.__checkpoints = {public_key: (list(numbers), list(balances))
+                              for public_key, (numbers, balances) in state["checkpoints"].items()}
+
+    def add_block(self, block):
+        for tx in (block["data"]["transactions"] or {}).values():
+            self.__credit(tx, self.__balances)
+            self.__changed.add(tx["to"])
+            self.__changed.add(tx["from"])
+
+        self.__height = block["header"]["block_number"]
+        if (self.__height + 1) % self.__checkpoint_interval == 0:
+            for public_key in self.__changed:
+                numbers, balances = self.__checkpoints.setdefault(public_key, ([], []))
+                numbers.append(self.__height)
+                balances.append(self.__balances.get(public_key, 0))
+            self.__changed.clear()
+
+    @staticmethod
+    def __credit(tx, balances):
+        balances[tx["to"]] = balances.get(tx["to"], 0) + tx["amount"]
+        if tx["from"] != tx["to"]:
+            balances[tx["from"]] = balances.get(tx["from"], 0) - tx["amount"]
+
+    def balance(self, public_key):
+        return self.__balances.get(public_key, 0)
+
+    def balance_at(self, public_key, block_number, chain):
+        """
+        Balance of public_key once block_number was mined
+
+        :param public_key: Address to look up
+        :param block_number: Block number at which the balance is wanted
+        :param chain: Sequence of blocks the ledger was built from, used to replay blocks after the checkpoint
+        :return: balance of the address
+        """
+        if block_number >= self.__height:
+            return self.balance(public_key)
+        if block_number < 0:
+            return 0
+
+        checkpoint = (block_number + 1) // self.__checkpoint_interval * self.__checkpoint_interval - 1
+        balance = 0
+        if checkpoint >= 0 and public_key in self.__checkpoints:
+            numbers, balances = self.__checkpoints[public_key]
+            i = bisect_right(numbers, checkpoint) - 1
+            if i >= 0:
+                balance = balances[i]
+
+        replay = {public_key: balance}
+        for number in range(checkpoint + 1, block_number + 1):
+            for tx in (chain[number]["data"]["transactions"] or {}).values():
+                if public_key in (tx["to"], tx["from"]):
+                    self.__credit(tx, replay)
+        return replay[public_key]
+
+
+class ContractRegistry:
+    """
+    Deployed contracts (cxid => creator and deploy block), a pointer to the message holding the latest state of
+    every contract and the location of every message sent to it.
+    """
+
+    def __init__(self):
+        self.__contracts = {}  # cxid => {"cxid", "from", "block_number"}
+        self.__latest = {}  # cxid => (block_number, mxid)
+        self.__history = {}  # cxid => ([block_number, ...], [mxid, ...])
+
+    def __len__(self):
+        return len(self.__contracts)
+
+    def __contains__(self, cxid):
+        return cxid in self.__contracts
+
+    def get(self, cxid):
+        return self.__contracts.get(cxid)
+
+    def clear(self):
+        self.__contracts.clear()
+        self.__latest.clear()
+        self.__history.clear()
+
+    def snapshot(self):
+        return {"contracts": self.__contracts, "latest": self.__latest, "history": self.__history}
+
+    def restore(self, state):
+        self.__contracts = {cxid: {"cxid": contract["cxid"], "from": contract["from"],
+                                   "block_number": int(contract["block_number"])}
+                            for cxid, contract in state["contracts"].items()}
+        self.__latest = {cxid: (int(block_number), mxid) for cxid, (block_number, mxid) in state["latest"].items()}
+        self.__history = {cxid: (list(numbers), list(mxids)) for cxid, (numbers, mxids) in state["history"].items()}
+
+    def add_block(self, block):
+        block_number = block["header"]["block_number"]
+        for cxid, cx in (block["data"]["contracts"] or {}).items():
+            self.__contracts[cxid] = {"cxid": cxid, "from": cx["from"], "block_number": block_number}
+
+        for mxid, mx in (block["data"]["messages"] or {}).items():
+            numbers, mxids = self.__history.setdefault(mx["to"], ([], []))
+            # The first message of a block to a contract holds the state of that block
+            if not numbers or numbers[-1] != block_number:
+                self.__latest[mx["to"]] = (block_number, mxid)
+            numbers.append(block_number)
+            mxids.append(mxid)
+
+    def state_location(self, cxid, block_number=None):
+        """
+        Location of the state of a contract once block_number was mined
+
+        :param cxid: Contract id
+        :param block_number: Block number, or None for the latest state
+        :return: (block_number, mxid) of the message holding the state, (block_number, None) when the state is
+                 still the one the contract was deployed with, or None if the contract did not exist yet
+        """
+        contract = self.__contracts.get(cxid)
+        if not contract or (block_number is not None and block_number < contract["block_number"]):
+            return None
+        if block_number is None:
+            return self.__latest.get(cxid, (contract["block_number"], None))
+
+        numbers, mxids = self.__history.get(cxid, ([], []))
+        i = bisect_right(numbers, block_number)
+        if not i:
+            return contract["block_number"], None
+        first = bisect_left(numbers, numbers[i - 1])
+        return numbers[first], mxids[first]
+
+    def messages(self, cxid):
+        """
+        Locations of every message sent to a contract, in chain order
+
+        :param cxid: Contract id
+        :return: tuple of lists -> ([block_number, ...], [mxid, ...])
+        """
+        return self.__history.get(cxid, ([], []))
@@ -1,79 +1,373 @@
+import json
+import heapq
 import random
 import time
+import zlib
+import threading
+from contextlib import ExitStack
+
+
+def item_size(item):
+    """
+    :return: Size in bytes of a jsonified transaction, contract or message as it is stored in a block
+    """
+    return len(json.dumps(item).encode())
+
+
+def check_inputs(transaction, utxo):
+    """
+    Check that a transaction spends unspent outputs of its sender, each once, covering its amount and fee
+
+    :param transaction: jsonified transaction
+    :param utxo: pythereum.index.UTXOSet of the chain
+    :return: Total amount of the inputs
+    :raises ValueError: when the transaction cannot be mined
+    """
+    if "change_from" in transaction or "fee_from" in transaction:
+        raise ValueError("Change and fee transactions are only created when mining")
+    input_txids = _TransactionPool.inputs(transaction)
+    if not input_txids or len(set(input_txids)) != len(input_txids):
+        raise ValueError("Transaction inputs must be unique and not empty")
+    total = 0
+    for input_txid in input_txids:
+        output = utxo.get(input_txid)
+        if output is None or output["owner"] != transaction["from"]:
+            raise ValueError(f"Input {input_txid} is not an unspent output of the sender")
+        total += output["amount"]
+    if transaction["amount"] + transaction.get("fee", 0) > total:
+        raise ValueError(f"Inputs of {total} PTH do not cover amount {transaction['amount']} and fee "
+                         f"{transaction.get('fee', 0)}")
+    return total
+
+
+class _Pool:
+    """
+    Pending items of one kind, or one shard of them, behind a single lock. Callers hold the lock.
+    """
+
+    def __init__(self, id_key):
+        self.lock = threading.Lock()
+        self.id_key = id_key
+        self.items = {}
+        self.sizes = {}  # id => size in bytes
+        self.bytes = 0
+        self.expiry = []  # min-heap of (time, id), entries of items that are gone are dropped as they come up
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, item, size):
+        item_id = item[self.id_key]
+        if item_id in self.items:
+            self.remove(item_id)
+        self.items[item_id] = item
+        self.sizes[item_id] = size
+        self.bytes += size
+        heapq.heappush(self.expiry, (item["time"], item_id))
+
+    def remove(self, item_id):
+        self.bytes -= self.sizes.pop(item_id)
+        return self.items.pop(item_id)
+
+    def expire(self, deadline):
+        while self.expiry and self.expiry[0][0] < deadline:
+            _, item_id = heapq.heappop(self.expiry)
+            if item_id in self.items:
+                self.remove(item_id)
+                self.expired += 1
+
+    def oldest(self):
+        while self.expiry and self.expiry[0][1] not in self.items:
+            heapq.heappop(self.expiry)
+        return self.expiry[0] if self.expiry else None
+
+    def evict_oldest(self):
+        _, item_id = heapq.heappop(self.expiry)
+        self.remove(item_id)
+        self.evicted += 1
+        return item_id
+
+
+class _TransactionPool(_Pool):
+    """
+    Shard of the pending transactions, with heaps of the best and worst fee per byte and the inputs each
+    transaction spends
+    """
+
+    def __init__(self):
+        super().__init__("txid")
+        self.heap = []  # (-fee per byte, time, txid)
+        self.entries = {}  # txid => its current heap entry, other entries for the txid are stale
+        self.low = []  # (fee per byte, -time, txid), lowest fee per byte and then newest first
+        self.low_entries = {}  # txid => its current entry in low
+        self.claims = {}  # input txid => {txids of the pending transactions spending it}
+
+    @staticmethod
+    def inputs(transaction):
+        input_txids = transaction["input_txids"]
+        return [input_txids] if isinstance(input_txids, str) else input_txids
+
+    def add(self, transaction, size):
+        txid = transaction["txid"]
+        fee = transaction.get("fee", 0)
+
+        conflicts = set().union(*(self.claims.get(i, ()) for i in self.inputs(transaction))) - {txid}
+        if conflicts:
+            conflicting_fee = sum(self.items[c].get("fee", 0) for c in conflicts)
+            if fee <= conflicting_fee:
+                raise ValueError(f"Transaction spends inputs of pending transactions {', '.join(sorted(conflicts))}. "
+                                 f"Replacing them needs a fee above {conflicting_fee}")
+            for conflict in conflicts:
+                self.remove(conflict)
+
+        super().add(transaction, size)
+        entry = (-fee / size, transaction["time"], txid)
+        low_entry = (fee / size, -transaction["time"], txid)
+        self.entries[txid] = entry
+        self.low_entries[txid] = low_entry
+        for input_txid in self.inputs(transaction):
+            self.claims.setdefault(input_txid, set()).add(txid)
+        heapq.heappush(self.heap, entry)
+        heapq.heappush(self.low, low_entry)
+
+    def remove(self, txid):
+        transaction = super().remove(txid)
+        del self.entries[txid]
+        del self.low_entries[txid]
+        for input_txid in self.inputs(transaction):
+            claims = self.claims.get(input_txid)
+            if claims is not None:
+                claims.discard(txid)
+                if not claims:
+                    del self.claims[input_txid]
+        return transaction
+
+    def top(self):
+        while self.heap and self.entries.get(self.heap[0][2]) is not self.heap[0]:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def bottom(self):
+        while self.low and self.low_entries.get(self.low[0][2]) is not self.low[0]:
+            heapq.heappop(self.low)
+        return self.low[0] if self.low else None
+
+    def evict_lowest(self):
+        txid = heapq.heappop(self.low)[2]
+        self.remove(txid)
+        self.evicted += 1
+        return txid
 
 
 class Mempool:
-    transactions = {}
-    contracts = {}
-    messages = {}
+    """
+    Pending transactions, contracts and messages of a node.
+
+    Transactions are sharded by sender, each shard with its own lock, so submissions from different senders do not
+    wait on each other. Within a shard transactions are kept in a heap ordered by fee per byte and mining takes the
+    best paying transactions across all shards first. Every shard indexes the inputs its pending transactions spend.
+    A transaction spending an input that a pending transaction already spends replaces it when it pays a higher fee
+    than every transaction it conflicts with combined, and is rejected with a ValueError otherwise.
+
+    Items older than ttl seconds expire. Every pool keeps a min-heap of (time, id), so expiring only touches the
+    expired items. When a kind of item grows past max_size items or max_bytes, the size of its entries as stored in
+    a block, the lowest paying transactions or the oldest contracts and messages are evicted. An item that would
+    be evicted straight away is rejected with a ValueError instead.
+    """
+
+    def __init__(self, *, ttl=300, max_size=None, max_bytes=None, shards=16):
+        """
+        :param ttl: Seconds an item stays in the mempool before it expires
+        :param max_size: Maximum number of transactions, contracts and messages each, None for no limit
+        :param max_bytes: Maximum total size in bytes of the transactions, contracts and messages each, None for
+                          no limit
+        :param shards: Number of transaction shards
+        """
+        assert shards > 0, "Mempool needs at least one shard"
+        self.configure(ttl=ttl, max_size=max_size, max_bytes=max_bytes)
+        self.__shards = [_TransactionPool() for _ in range(shards)]
+        self.__contracts = _Pool("cxid")
+        self.__messages = _Pool("mxid")
+
+    def configure(self, *, ttl=300, max_size=None, max_bytes=None):
+        assert ttl > 0, "Mempool ttl must be positive"
+        assert max_size is None or max_size > 0, "Mempool max size must be positive"
+        assert max_bytes is None or max_bytes > 0, "Mempool max bytes must be positive"
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+
+    @property
+    def transactions(self):
+        transactions = {}
+        for shard in self.__shards:
+            with shard.lock:
+                transactions.update(shard.items)
+        return transactions
+
+    @property
+    def contracts(self):
+        with self.__contracts.lock:
+            return dict(self.__contracts.items)
+
+    @property
+    def messages(self):
+        with self.__messages.lock:
+            return dict(self.__messages.items)
+
+    def stats(self):
+        """
+        :return: Dictionary -> {"ttl", "max_size", "max_bytes", "size", "bytes", "expired", "evicted"}, the last
+                 four holding a count per kind of item. expired and evicted count since the mempool was created.
+        """
+        pools = {"transactions": self.__shards, "contracts": [self.__contracts], "messages": [self.__messages]}
+        return {"ttl": self.ttl, "max_size": self.max_size, "max_bytes": self.max_bytes,
+                "size": {mem_type: sum(len(pool.items) for pool in p) for mem_type, p in pools.items()},
+                "bytes": {mem_type: sum(pool.bytes for pool in p) for mem_type, p in pools.items()},
+                "expired": {mem_type: sum(pool.expired for pool in p) for mem_type, p in pools.items()},
+                "evicted": {mem_type: sum(pool.evicted for pool in p) for mem_type, p in pools.items()}}
+
+    def __shard(self, sender):
+        return self.__shards[zlib.crc32(sender.encode()) % len(self.__shards)]
+
+    def __deadline(self):
+        return time.time() - self.ttl
 
-    # Add transaction to transaction dictionary
-    @classmethod
-    def add_transaction(cls, transaction):
+    def __over_budget(self, pools):
+        return (self.max_size is not None and sum(len(pool.items) for pool in pools) > self.max_size) or \
+            (self.max_bytes is not None and sum(pool.bytes for pool in pools) > self.max_bytes)
+
+    def __check_size(self, size):
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise ValueError(f"Item of {size} bytes does not fit in the mempool budget of {self.max_bytes} bytes")
+
+    # Add transaction to the shard of its sender
+    def add_transaction(self, transaction, utxo=None):
+        """
+        :param transaction: Transaction or its JSON shape
+        :param utxo: pythereum.index.UTXOSet to check the inputs against, see check_inputs()
+        :raises ValueError: when the transaction is rejected
+        """
         if not isinstance(transaction, dict):
             transaction = transaction.jsonify()
-        cls.transactions[transaction["txid"]] = transaction
+        if utxo is not None:
+            check_inputs(transaction, utxo)
+        size = item_size(transaction)
+        self.__check_size(size)
+        shard = self.__shard(transaction["from"])
+        with shard.lock:
+            shard.expire(self.__deadline())
+            shard.add(transaction, size)
+        if self.__over_budget(self.__shards) and transaction["txid"] in self.__evict_transactions():
+            raise ValueError("Mempool is full. Transaction fee per byte is too low")
+
+    def get_transaction(self, txid, sender):
+        """
+        :return: the pending transaction sent by sender with id txid, or None
+        """
+        shard = self.__shard(sender)
+        with shard.lock:
+            return shard.items.get(txid)
+
+    def is_claimed(self, input_txid, sender):
+        """
+        :return: bool indicating if a pending transaction of sender spends the output input_txid
+        """
+        shard = self.__shard(sender)
+        with shard.lock:
+            return input_txid in shard.claims
+
+    def __evict_transactions(self):
+        # Finding the lowest paying transaction needs every shard, locked in a fixed order
+        evicted = set()
+        with ExitStack() as stack:
+            for shard in self.__shards:
+                stack.enter_context(shard.lock)
+            while self.__over_budget(self.__shards):
+                lowest = min((s for s in self.__shards if s.bottom()), key=lambda s: s.bottom())
+                evicted.add(lowest.evict_lowest())
+        return evicted
+
+    def __add(self, pool, item):
+        size = item_size(item)
+        self.__check_size(size)
+        with pool.lock:
+            pool.add(item, size)
+            pool.expire(self.__deadline())
+            evicted = set()
+            while self.__over_budget([pool]):
+                pool.oldest()
+                evicted.add(pool.evict_oldest())
+        if item[pool.id_key] in evicted:
+            raise ValueError("Mempool is full. Item is older than every pending one")
 
     # Add contract to contracts dictionary
-    @classmethod
-    def add_contract(cls, contract):
-        if isinstance(contract, dict):
-            cls.contracts[contract["cxid"]] = contract
-        else:
-            cls.contracts[contract.cxid] = contract.jsonify()
+    def add_contract(self, contract):
+        """
+        :param contract: Contract or its JSON shape
+        :raises ValueError: when the contract is rejected
+        """
+        if not isinstance(contract, dict):
+            contract = contract.jsonify()
+        self.__add(self.__contracts, contract)
 
     # Add message to messages dictionary
-    @classmethod
-    def add_message(cls, message):
-        if isinstance(message, dict):
-            cls.messages[message["mxid"]] = message
-        else:
-            cls.messages[message.mxid] = message.jsonify()
-
-    # Pop transactions from transactions dictionary
-    @classmethod
-    def pop_transactions(cls, n=5):
-        for txid, tx in cls.transactions.items():
-            if time.time() - tx["time"] > 300:
-                del cls.transactions[txid]
-
-        n = min(len(cls.transactions), n, 10)
-        s_tx = random.sample(cls.transactions.keys(), n)
-
-        txs = []
-        for txid in s_tx:
-            txs.append(cls.transactions[txid])
-            del cls.transactions[txid]
-        return txs
+    def add_message(self, message):
+        """
+        :param message: Message or its JSON shape
+        :raises ValueError: when the message is rejected
+        """
+        if not isinstance(message, dict):
+            message = message.jsonify()
+        self.__add(self.__messages, message)
 
-    # Pop contracts from contracts dictionary
-    @classmethod
-    def pop_contracts(cls, n=5):
-        for cxid, cx in cls.contracts.items():
-            if time.time() - cx["time"] > 300:
-                del cls.contracts[cxid]
+    # Pop the transactions paying the highest fee per byte
+    def pop_transactions(self, n=5, max_bytes=None):
+        """
+        :param n: Maximum number of transactions
+        :param max_bytes: Maximum total size of the transactions, see item_size(). Transactions that do
+                          not fit are skipped for smaller ones and stay in the mempool.
+        :return: list of jsonified transactions, highest fee per byte first
+        """
+        with ExitStack() as stack:
+            for shard in self.__shards:
+                stack.enter_context(shard.lock)
+            deadline = self.__deadline()
+            for shard in self.__shards:
+                shard.expire(deadline)
 
-        n = min(len(cls.contracts), n, 10)
-        s_cx = random.sample(cls.contracts.keys(), n)
+            # Merge the shards by always taking the best of their tops
+            tops = [(shard.top(), i) for i, shard in enumerate(self.__shards) if shard.top()]
+            heapq.heapify(tops)
+            txs = []
+            skipped = []
+            budget = max_bytes
+            while tops and len(txs) < n:
+                entry, i = heapq.heappop(tops)
+                shard = self.__shards[i]
+                heapq.heappop(shard.heap)
+                txid = entry[2]
+                if budget is not None and shard.sizes[txid] > budget:
+                    skipped.append((shard, entry))
+                else:
+                    if budget is not None:
+                        budget -= shard.sizes[txid]
+                    txs.append(shard.remove(txid))
+                if shard.top():
+                    heapq.heappush(tops, (shard.top(), i))
+            for shard, entry in skipped:
+                heapq.heappush(shard.heap, entry)
+        return txs
 
-        cxs = []
-        for cxid in s_cx:
-            cxs.append(cls.contracts[cxid])
-            del cls.contracts[cxid]
-        return cxs
+    def __pop_sample(self, pool, n):
+        with pool.lock:
+            pool.expire(self.__deadline())
+            n = min(len(pool.items), n, 10)
+            return [pool.remove(item_id) for item_id in random.sample(list(pool.items), n)]
+
+    # Pop contracts from contracts dictionary
+    def pop_contracts(self, n=5):
+        return self.__pop_sample(self.__contracts, n)
 
     # Pop messages from messages dictionary
-    @classmethod
-    def pop_messages(cls, n=5):
-        for mxid, mx in cls.messages.items():
-            if time.time() - mx["time"] > 300:
-                del cls.messages[mxid]
-
-        n = min(len(cls.messages), n, 10)
-        s_mx = random.sample(cls.messages.keys(), n)
-
-        mxs = []
-        for mxid in s_mx:
-            mxs.append(cls.messages[mxid])
-            del cls.messages[mxid]
-        return mxs
+    def pop_messages(self, n=5):
+        return self.__pop_sample(self.__messages, n)
@@ -0,0 +1,132 @@
+import os
+import time
+import queue
+import hashlib
+import secrets
+import threading
+import multiprocessing
+
+NONCE_SPACE = 2 ** 128
+BATCH_SIZE = 4096
+POLL_INTERVAL = 0.1  # seconds between checks that the workers are still alive
+
+
+def _search(prefix, suffix, target, start, step, stop_event, results):
+    """
+    Try nonces start, start + step, start + 2 * step, ... until one gives a hash no larger than target or
+    stop_event is set. Reports ("found", nonce, hashes) or ("done", None, hashes) on the results queue.
+
+    The header prefix is hashed once and the hash state is copied for every nonce.
+    """
+    # Digests and target have the same length, so comparing the raw bytes compares the numbers
+    target = target.to_bytes(32, "big")
+    copy = hashlib.sha256(prefix.encode()).copy
+    suffix = suffix.encode()
+    nonce = start
+    hashes = 0
+    while not stop_event.is_set():
+        for _ in range(BATCH_SIZE):
+            sha256 = copy()
+            sha256.update(b"%032x%s" % (nonce, suffix))
+            hashes += 1
+            if sha256.digest() <= target:
+                stop_event.set()
+                results.put(("found", f"{nonce:032x}", hashes))
+                return
+            nonce = (nonce + step) % NONCE_SPACE
+    results.put(("done", None, hashes))
+
+
+class Miner:
+    """
+    Proof of work search over the block nonce. The nonce space is split across a pool of worker processes, each
+    trying every workers-th nonce from a random starting point. The first worker to find a valid nonce stops
+    the others. With a single worker the search runs in the calling process, workers=None uses every core.
+    """
+
+    def __init__(self, workers=1):
+        self.__workers = int(workers) if workers is not None else os.cpu_count() or 1
+        assert self.__workers > 0, "Miner needs at least one worker"
+        self.__last_stats = None
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    @property
+    def last_stats(self):
+        """
+        :return: Dictionary -> {"hashes": 0, "seconds": 0.0, "hash_rate": 0.0, "workers": 1} of the last search
+        """
+        return self.__last_stats
+
+    def mine(self, block, target):
+        """
+        Sets the time and nonce of block so its hash, read as an integer, is no larger than target
+
+        :param block: pythereum.block.Block to mine
+        :param target: Proof of work target, see pythereum.difficulty
+        :return: the mined block
+        """
+        started = time.time()
+        if int(block.hash, 16) <= target:
+            self.__last_stats = {"hashes": 0, "seconds": 0.0, "hash_rate": 0.0, "workers": self.__workers}
+            return block
+
+        block.update_time()
+        prefix, suffix = block.header_prefix()
+        start = secrets.randbelow(NONCE_SPACE)
+
+        if self.__workers == 1:
+            results = queue.Queue()
+            _search(prefix, suffix, target, start, 1, threading.Event(), results)
+            _, nonce, hashes = results.get()
+        else:
+            nonce, hashes = self.__search_parallel(prefix, suffix, target, start)
+
+        block.nonce = nonce
+        block.update_hash()
+        seconds = time.time() - started
+        self.__last_stats = {"hashes": hashes, "seconds": seconds,
+                             "hash_rate": hashes / seconds if seconds else 0.0, "workers": self.__workers}
+        return block
+
+    def __search_parallel(self, prefix, suffix, target, start):
+        stop_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_search, daemon=True,
+                                         args=(prefix, suffix, target, (start + i) % NONCE_SPACE,
+                                               self.__workers, stop_event, results))
+                 for i in range(self.__workers)]
+        for proc in procs:
+            proc.start()
+
+        nonce = None
+        hashes = 0
+        reports = 0
+        try:
+            # Every worker reports exactly once, either with a nonce or with its hash count once stopped
+            while reports < len(procs):
+                try:
+                    status, found, worker_hashes = results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    dead = [proc for proc in procs if proc.exitcode not in (None, 0)]
+                    if not dead:
+                        continue
+                    if nonce is not None:
+                        # The nonce is found, only the hash count of the dead worker is missing
+                        break
+                    raise RuntimeError(f"Mining worker {dead[0].pid} died with exit code {dead[0].exitcode}")
+                reports += 1
+                hashes += worker_hashes
+                if status == "found" and nonce is None:
+                    nonce = found
+        finally:
+            stop_event.set()
+            for proc in procs:
+                proc.join(POLL_INTERVAL * 10)
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join()
+        return nonce, hashes
+
@@ -1,28 +1,116 @@
 import time
 import secrets
 import hashlib
-
-from pythereum.block import Block, MerkleTree
-from pythereum.mempool import Mempool
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from pythereum.block import Block, MerkleAccumulator, merkle_mode
+from pythereum.index import UTXOSet, TransactionIndex, BlockIndex, BalanceLedger, ContractRegistry
+from pythereum.mempool import Mempool, check_inputs
+from pythereum.miner import Miner
+from pythereum.validation import ChainVerifier, ChainSnapshot, ValidationJob
+from pythereum.difficulty import Difficulty
 from pythereum.compile import CompileContract
-from pythereum.transaction import Transaction, Contract, Message
+from pythereum.transaction import Transaction, Contract, Message, signed_item
 from pythereum.wallet import sign_item
 
 
 class Pythereum:
-    def __init__(self, difficulty=4):
-        self.__difficulty = int(difficulty)
-
-        genesis_transaction = Transaction(t_from="luPzDifFO0PBHx9MoVrEuBDuJ3DPvBdWm4PTeltKMewt6HG7gkwqyWcRULb5l37Y",
-                                          t_to="luPzDifFO0PBHx9MoVrEuBDuJ3DPvBdWm4PTeltKMewt6HG7gkwqyWcRULb5l37Y",
-                                          signature="0FAB5A6X8h7amAkjiuz5IbQUdKdNUQmvDDW50/hXrFykg6BYbzcJ4Ar9s2v1B09z",
-                                          input_txids="null",
-                                          value=1000000000000)
-        self.__chain = [Block(block_number=0, block_nonce=secrets.token_hex(16),
-                              previous_block_hash=None,
-                              transactions=[genesis_transaction]).jsonify()]
-
-        self.__mempool = Mempool
+    def __init__(self, difficulty=4, *, store=None, checkpoint_interval=100, miner=None, block_time=None,
+                 retarget_interval=10, verifier=None, mempool=None):
+        """
+        :param difficulty: Number of leading hex zeros required in a block hash, may be fractional
+        :param store: Block storage backend, such as pythereum.storage.FileBlockStore. Defaults to an in-memory
+                      list. An existing chain in the store is reopened instead of starting a new one.
+        :param checkpoint_interval: Number of blocks between two balance checkpoints
+        :param miner: pythereum.miner.Miner used for proof of work. Defaults to a single process miner, pass
+                      Miner(workers=None) to use every core.
+        :param block_time: Target seconds per block. When set, the difficulty is retargeted every
+                           retarget_interval blocks from the observed block times. Fixed otherwise.
+        :param retarget_interval: Number of blocks between two retargets
+        :param verifier: pythereum.validation.ChainVerifier used by verify_chain. Defaults to a single process
+                         verifier, pass ChainVerifier(workers=None) to use every core and
+                         ChainVerifier(signatures=True) to verify the signatures in the blocks again.
+        :param mempool: pythereum.mempool.Mempool holding the pending items of this node. Defaults to a new
+                        Mempool(), pass Mempool(ttl=..., max_size=...) to change how long and how many items are kept.
+        """
+        self.__difficulty = Difficulty(difficulty, block_time=block_time, retarget_interval=retarget_interval)
+        self.__miner = miner or Miner()
+        self.__verifier = verifier or ChainVerifier()
+        self.__verified_height = 0  # Blocks below this number passed verify_chain
+        self.__verify_failures = 0  # Number of verifications that found an invalid block
+        self.__verify_lock = threading.Lock()  # Guards the two above
+        # Held while appending a block and updating the indexes, by validation while it reads the chain and by
+        # the readers of the UTXO set
+        self.__chain_lock = threading.RLock()
+        self.__validation_jobs = OrderedDict()  # job_id => ValidationJob, oldest first
+
+        self.__chain = store if store is not None else []
+        self.__utxo = UTXOSet()
+        self.__tx_index = TransactionIndex()
+        self.__block_index = BlockIndex()
+        self.__ledger = BalanceLedger(checkpoint_interval)
+        self.__contracts = ContractRegistry()
+        self.__indexes = [self.__utxo, self.__tx_index, self.__block_index, self.__ledger, self.__contracts]
+        self.__index_names = ["utxo", "transactions", "blocks", "balances", "contracts"]  # keys in snapshots
+        self.__merkle_trees = OrderedDict()  # block_number => MerkleAccumulator of its transactions, most recent last
+
+        if len(self.__chain):
+            self.__reopen()
+        else:
+            genesis_transaction = Transaction(
+                t_from="luPzDifFO0PBHx9MoVrEuBDuJ3DPvBdWm4PTeltKMewt6HG7gkwqyWcRULb5l37Y",
+                t_to="luPzDifFO0PBHx9MoVrEuBDuJ3DPvBdWm4PTeltKMewt6HG7gkwqyWcRULb5l37Y",
+                signature="0FAB5A6X8h7amAkjiuz5IbQUdKdNUQmvDDW50/hXrFykg6BYbzcJ4Ar9s2v1B09z",
+                input_txids="null",
+                value=1000000000000,
+                signature_version=1)
+            self.__append_block(Block(block_number=0, block_nonce=secrets.token_hex(16),
+                                      previous_block_hash=None,
+                                      transactions=[genesis_transaction]).jsonify())
+
+        self.__mempool = mempool if mempool is not None else Mempool()
+
+    def __reopen(self):
+        # Start from the index snapshot taken by close() and only replay the blocks appended after it
+        height = 0
+        snapshot = self.__chain.read_snapshot() if hasattr(self.__chain, "read_snapshot") else None
+        if snapshot:
+            height, state = snapshot
+            try:
+                for name, index in zip(self.__index_names, self.__indexes):
+                    index.restore(state[name])
+            except (KeyError, TypeError, ValueError):
+                # Snapshot of another layout or taken with other parameters, replay the whole chain instead
+                height = 0
+                for index in self.__indexes:
+                    index.clear()
+        for block_number in range(height, len(self.__chain)):
+            block = self.__chain[block_number]
+            for index in self.__indexes:
+                index.add_block(block)
+        # The target follows from the time of every block, which only needs the (eagerly decoded) headers
+        if self.__difficulty.adaptive:
+            for block in self.__chain:
+                self.__difficulty.add_block(block)
+
+    def __append_block(self, block):
+        with self.__chain_lock:
+            self.__chain.append(block)
+            for index in self.__indexes:
+                index.add_block(block)
+            self.__difficulty.add_block(block)
+
+    def close(self):
+        """
+        Flush the block store, saving the chain indexes so the next reopen does not have to replay the chain
+        """
+        if hasattr(self.__chain, "write_snapshot"):
+            self.__chain.write_snapshot({name: index.snapshot()
+                                         for name, index in zip(self.__index_names, self.__indexes)})
+        if hasattr(self.__chain, "close"):
+            self.__chain.close()
 
     @property
     def top_block(self):
@@ -32,11 +120,23 @@ class Pythereum:
 
     @property
     def blocks(self):
-        return self.__chain or None
+        return list(self.__chain) or None
 
     @property
     def difficulty(self):
-        return self.__difficulty
+        return self.__difficulty.difficulty
+
+    @property
+    def target(self):
+        return self.__difficulty.target
+
+    @property
+    def mining_stats(self):
+        return self.__miner.last_stats
+
+    @property
+    def mempool_stats(self):
+        return self.__mempool.stats()
 
     def get_mempool(self, mem_type):
         if mem_type == "transactions":
@@ -47,23 +147,38 @@ class Pythereum:
             return self.__mempool.messages
         return None
 
-    def send_pth(self, t_from, t_to, value, private_key, *, data=None):
+    def send_pth(self, t_from, t_to, value, private_key, *, data=None, fee=0.0, replaces=None):
+        """
+        :param fee: Paid to the miner on top of value, transactions are mined in order of fee per byte
+        :param replaces: Id of a pending transaction of t_from to replace. The new transaction spends all of its
+                         inputs, and fee has to be higher than its fee, see pythereum.mempool.Mempool
+        """
         value = float(value)
+        fee = float(fee)
 
         assert t_from != t_to, "Cannot send PTH to yourself"
-        assert self.get_balance(t_from) >= value, f"Not enough balance to send {value} PTH"
-
-        utxos = self.get_utxo(t_from)
-        txs = []
-        for block in self.__chain[::-1]:
-            for txid, tx in block["data"]["transactions"].items():
-                if txid in utxos:
-                    txs.append(tx)
-
-        utxos = []
-        value_left = value
+        assert self.get_balance(t_from) >= value + fee, f"Not enough balance to send {value} PTH with fee {fee}"
+
+        replaced = self.__mempool.get_transaction(replaces, t_from) if replaces else None
+        assert not replaces or replaced, f"No pending transaction {replaces} from {t_from} to replace"
+        freed = set(replaced["input_txids"]) if replaced else set()
+
+        # Outputs already spent by pending transactions would be rejected by the mempool
+        with self.__chain_lock:
+            outputs = self.__utxo.outputs(t_from)
+        txs = [tx for tx in outputs if tx["txid"] in freed or not self.__mempool.is_claimed(tx["txid"], t_from)]
+        assert sum(tx["amount"] for tx in txs) >= value + fee, \
+            f"Not enough unspent outputs to send {value} PTH with fee {fee}, pending transactions spend the rest"
+
+        # A replacement spends every input of the transaction it replaces, so the two can never both be mined
+        utxos = [tx["txid"] for tx in txs if tx["txid"] in freed]
+        value_left = value + fee - sum(tx["amount"] for tx in txs if tx["txid"] in freed)
         for tx in txs:
-            if tx["amount"] > value:
+            if value_left <= 0:
+                break
+            elif tx["txid"] in freed:
+                continue
+            elif not utxos and tx["amount"] > value + fee:
                 utxos = [tx["txid"]]
                 break
             elif value_left - tx["amount"] <= 0:
@@ -73,79 +188,170 @@ class Pythereum:
                 utxos.append(tx["txid"])
                 value_left -= tx["amount"]
 
-        signature = sign_item(private_key, f"{value}{t_from}")
+        signature = sign_item(private_key, signed_item(value, t_from, fee, t_to=t_to, input_txids=utxos,
+                                                       data=data))
         tx = Transaction(t_from=t_from, t_to=t_to, value=value, signature=signature, input_txids=utxos,
-                         data=data)
-        self.__mempool.add_transaction(tx)
+                         data=data, fee=fee)
+        # A block mined since the outputs were read may have spent them, check_inputs rejects the transaction then
+        with self.__chain_lock:
+            self.__mempool.add_transaction(tx, self.__utxo)
         return tx.jsonify()
 
     def get_transaction(self, txid):
-        for block in self.__chain[::-1]:
-            for ttxid in block["data"]["transactions"].keys():
-                if ttxid == txid:
-                    return block["data"]["transactions"][txid]
-        return None
-
-    def get_balance(self, public_key):
-        balance = 0
-        for block in self.__chain[::-1]:
-            for _, tx in block["data"]["transactions"].items():
-                if tx["to"] == public_key:
-                    balance += tx["amount"]
-                elif tx["from"] == public_key:
-                    balance -= tx["amount"]
-        return balance
+        location = self.__tx_index.get(txid)
+        if location is None:
+            return None
+        return self.__chain[location[0]]["data"]["transactions"][txid]
+
+    def get_transaction_location(self, txid):
+        return self.__tx_index.get(txid)
+
+    def get_transaction_proof(self, txid):
+        """
+        Merkle inclusion proof of a mined transaction, so a client holding only the block header can check it
+        with pythereum.block.verify_merkle_proof(txid, proof, merkle_root, mode)
+
+        :param txid: Transaction id
+        :return: Dictionary -> {"txid", "block_number", "block_hash", "merkle_root", "mode", "proof"} or None if
+                 the transaction is not on the chain
+        """
+        location = self.__tx_index.get(txid)
+        if location is None:
+            return None
+        block_number, position = location
+        block = self.__chain[block_number]
+        mode = merkle_mode(block["header"].get("version", 1))
+
+        tree = self.__merkle_trees.pop(block_number, None)
+        if tree is None:
+            tree = MerkleAccumulator(*block["data"]["transactions"], mode=mode)
+        self.__merkle_trees[block_number] = tree
+        if len(self.__merkle_trees) > 64:
+            self.__merkle_trees.popitem(last=False)
+
+        return {"txid": txid, "block_number": block_number, "block_hash": block["block_hash"],
+                "merkle_root": block["header"]["merkle_root"]["transactions"], "mode": mode,
+                "proof": tree.proof(position)}
+
+    def get_balance(self, public_key, block_number=None):
+        if block_number is None:
+            return self.__ledger.balance(public_key)
+        return self.__ledger.balance_at(public_key, int(block_number), self.__chain)
 
     def get_utxo(self, public_key):
+        with self.__chain_lock:
+            return self.__utxo.txids(public_key)
+
+    def __scan_utxo(self, public_key):
         utxos = []
-        for block in self.__chain[::-1]:
-            for txid, tx in block["data"]["transactions"].items():
+        for block in reversed(self.__chain):
+            for txid, tx in (block["data"]["transactions"] or {}).items():
                 if tx["to"] == public_key:
                     utxos.append(txid)
-        for block in self.__chain[::-1]:
-            for txid, tx in block["data"]["transactions"].items():
+        for block in reversed(self.__chain):
+            for txid, tx in (block["data"]["transactions"] or {}).items():
                 if tx["from"] == public_key:
                     for input_txs in tx["input_txids"]:
                         if input_txs in utxos:
                             utxos.remove(input_txs)
         return utxos
 
+    def rebuild_utxo(self):
+        with self.__chain_lock:
+            self.__utxo.clear()
+            for block in self.__chain:
+                self.__utxo.add_block(block)
+
+    def verify_utxo(self):
+        with self.__chain_lock:
+            addresses = set()
+            for block in self.__chain:
+                for tx in (block["data"]["transactions"] or {}).values():
+                    addresses.add(tx["to"])
+                    addresses.add(tx["from"])
+
+            for public_key in addresses:
+                expected = self.__scan_utxo(public_key)
+                if self.__utxo.txids(public_key) != expected:
+                    return {"result": False, "message": f"UTXO set for {public_key} is inconsistent with the chain. "
+                                                        f"Expected {expected}, got {self.__utxo.txids(public_key)}"}
+            if set(self.__utxo.owners()) - addresses:
+                return {"result": False, "message": "UTXO set holds outputs for addresses not found on the chain"}
+            return {"result": True, "message": "UTXO set is consistent with the chain"}
+
     def get_contract(self, cxid):
-        for block in self.__chain[::-1]:
-            if block["data"]["contracts"]:
-                for ccxid, cx in block["data"]["contracts"].items():
-                    if ccxid == cxid:
-                        return cx
-        return None
+        contract = self.__contracts.get(cxid)
+        if not contract:
+            return None
+        return self.__chain[contract["block_number"]]["data"]["contracts"][cxid]
 
-    def get_contract_state(self, cxid):
-        for block in self.__chain[::-1]:
-            if block["data"]["messages"]:
-                for mxid, mx in block["data"]["messages"].items():
-                    if mx["to"] == cxid:
-                        return mx["data"]["reply"]["state_vars"]
-            if block["data"]["contracts"]:
-                for ccxid, cx in block["data"]["contracts"].items():
-                    if ccxid == cxid:
-                        return cx["state"]["state_vars"]
-        return None
+    def get_contract_state(self, cxid, block_number=None):
+        location = self.__contracts.state_location(cxid, block_number)
+        if not location:
+            return None
+        block_number, mxid = location
+        block = self.__chain[block_number]
+        if mxid:
+            return block["data"]["messages"][mxid]["data"]["reply"]["state_vars"]
+        return block["data"]["contracts"][cxid]["state"]["state_vars"]
 
     def get_all_emits(self, cxid, list_only=False):
+        numbers, mxids = self.__contracts.messages(cxid)
         emits = {}
-        for block in self.__chain[::-1]:
-            if block["data"]["messages"]:
-                for mxid, mx in block["data"]["messages"].items():
-                    if mx["to"] == cxid:
-                        emits[mxid] = mx["data"]["reply"]["emits"]
+        # Newest block first, messages of a block in the order they were mined
+        for i in sorted(range(len(mxids)), key=lambda i: (-numbers[i], i)):
+            emits[mxids[i]] = self.__chain[numbers[i]]["data"]["messages"][mxids[i]]["data"]["reply"]["emits"]
         return emits if not list_only else list(emits.values())
 
+    def query_emits(self, cxid, *, from_block=None, to_block=None, limit=None, cursor=None, contains=None,
+                    prefix=None):
+        """
+        Emits of the messages sent to a contract, oldest first. Messages are located through the contract
+        registry, so only the blocks inside the requested range are read.
+
+        :param cxid: Contract id
+        :param from_block: First block number to include
+        :param to_block: Last block number to include
+        :param limit: Maximum number of messages to return
+        :param cursor: next_cursor of a previous query, to resume where it stopped
+        :param contains: Only keep emitted lines containing this substring
+        :param prefix: Only keep emitted lines starting with this prefix
+        :return: Dictionary -> {
+                                "emits": [{"block_number": 1, "mxid": "...", "emits": ["line", ...]}, ...],
+                                "next_cursor": "cursor to pass to the next query, None when exhausted"
+                                }
+        """
+        numbers, mxids = self.__contracts.messages(cxid)
+        start = bisect_left(numbers, int(from_block)) if from_block is not None else 0
+        end = bisect_right(numbers, int(to_block)) if to_block is not None else len(numbers)
+        if cursor is not None:
+            start = max(start, int(cursor))
+        if limit is not None:
+            limit = int(limit)
+            assert limit > 0, "Limit must be positive"
+
+        emits = []
+        next_cursor = None
+        for i in range(start, end):
+            if limit is not None and len(emits) == limit:
+                next_cursor = str(i)
+                break
+            lines = self.__chain[numbers[i]]["data"]["messages"][mxids[i]]["data"]["reply"]["emits"]
+            if contains is not None or prefix is not None:
+                lines = [line for line in lines if (contains is None or contains in line)
+                         and (prefix is None or line.startswith(prefix))]
+                if not lines:
+                    continue
+            emits.append({"block_number": numbers[i], "mxid": mxids[i], "emits": lines})
+        return {"emits": emits, "next_cursor": next_cursor}
+
     def get_block(self, block_id):
         if isinstance(block_id, int):
             return self.__chain[block_id]
-        for block in self.__chain[::-1]:
-            if block["block_hash"] == block_id:
-                return block
-        return None
+        block_number = self.__block_index.get(block_id)
+        if block_number is None:
+            return None
+        return self.__chain[block_number]
 
     def create_contract(self, code, public_key, private_key):
         signature = sign_item(private_key, code)
@@ -179,57 +385,47 @@ class Pythereum:
     def __getitem__(self, item):
         return self.get_block(item)
 
-    def mine_block(self, *, n_tx=5, n_cx=5, n_mx=5):
-        transactions = self.__mempool.pop_transactions(n_tx)
-        tx_to_drop = []
+    def mine_block(self, *, n_tx=5, n_cx=5, n_mx=5, max_tx_bytes=None, fee_to=None):
+        """
+        :param n_tx: Maximum number of transactions taken from the mempool, highest fee per byte first
+        :param max_tx_bytes: Maximum total size of the transactions taken from the mempool
+        :param fee_to: Address the transaction fees are paid to. Without it fees are returned with the change.
+        :return: the mined block or None if there was nothing to mine
+        """
+        transactions = self.__mempool.pop_transactions(n_tx, max_bytes=max_tx_bytes)
         input_total = {}  # txid => amount
-        available_utxos = {}  # user_key => [unspent, utxos]
 
-        # Validate each transaction
-        for tx in transactions:
-            t_from = tx["from"]
-            txid = tx["txid"]
-
-            if t_from not in available_utxos:
-                available_utxos[t_from] = self.get_utxo(t_from)
-            if not available_utxos[t_from]:  # No available utxos for this person
-                tx_to_drop.append(txid)
-                continue
-            elif "change_from" in tx:  # Change tx should not be in mempool
-                tx_to_drop.append(txid)
-
-            # Get transaction input total
-            input_total[txid] = 0
-            for input_txid in tx["input_txids"]:
-
-                # Cannot reuse same utxo
-                if input_txid not in available_utxos[t_from] or tx["input_txids"].count(input_txid) > 1:
-                    tx_to_drop.append(txid)
-                    break
-                i_tx = self.get_transaction(input_txid)
-                input_total[txid] += i_tx["amount"]
-            if tx_to_drop and tx_to_drop[-1] == txid:
-                continue
-            elif tx["amount"] > input_total[txid]:
-                tx_to_drop.append(txid)
-                continue
-            else:
-                for input_txid in tx["input_txids"]:
-                    available_utxos[t_from].remove(input_txid)
-
-        # Drop all invalid transactions
-        transactions[:] = [t for t in transactions if t.get("txid") not in tx_to_drop]
-        for txid in tx_to_drop:
-            if txid in input_total:
-                del input_total[txid]
+        # Inputs were checked against the UTXO set and the pending transactions when the transactions entered the
+        # mempool, this only drops transactions whose inputs a block has spent since
+        valid = []
+        with self.__chain_lock:
+            for tx in transactions:
+                try:
+                    input_total[tx["txid"]] = check_inputs(tx, self.__utxo)
+                    valid.append(tx)
+                except ValueError:
+                    continue
+        transactions = valid
 
         # Create change Transaction
         change_tx = []
         for tx in transactions:
             txid = tx["txid"]
-            if input_total[txid] > tx["amount"]:
+            fee = tx.get("fee", 0) if fee_to else 0
+            if fee:
+                change_tx.append({
+                    "from": tx["to"],
+                    "to": fee_to,
+                    "time": time.time(),
+                    "amount": fee,
+                    "signature": "null",
+                    "input_txids": "null",
+                    "txid": hashlib.sha256(f"{tx['to']}{fee_to}{fee}{time.time()}{txid}".encode()).hexdigest(),
+                    "fee_from": txid
+                })
+            if input_total[txid] > tx["amount"] + fee:
                 # Create change transaction here
-                change_amount = input_total[txid] - tx["amount"]
+                change_amount = input_total[txid] - tx["amount"] - fee
                 change_tx.append({
                     "from": tx["to"],
                     "to": tx["from"],
@@ -253,59 +449,68 @@ class Pythereum:
                       previous_block_hash=self.__chain[-1]["block_hash"],
                       transactions=transactions, contracts=contracts, messages=messages)
 
-        while not block.hash.startswith('0'*self.__difficulty):
-            block.nonce = secrets.token_hex(16)
-            block.update_time()
-            block.update_hash()
+        self.__miner.mine(block, self.__difficulty.target)
 
-        self.__chain.append(block.jsonify())
+        self.__append_block(block.jsonify())
         return block.jsonify()
 
-    def verify_chain(self):
-        for i, block in enumerate(self.__chain[::-1]):
-            header = block["header"]
-            merkle_roots = header["merkle_root"]
-
-            if header["block_number"] != len(self.__chain) - i - 1:
-                return {"result": False, "message": f"Inconsistent block numbering. Expected "
-                                                    f"#{len(self.__chain) - i - 1} "
-                                                    f"for block with hash {block['block_hash']} but "
-                                                    f"got #{header['block_number']}"}
-            if not header["block_number"]:
-                continue
-            
-            if block["block_hash"] != hashlib.sha256(
-                    f"{header['block_number']}{header['block_time']}{header['block_nonce']}"
-                    f"{header['previous_block_hash']}{merkle_roots['transactions']}{merkle_roots['contracts']}"
-                    f"{merkle_roots['messages']}".encode()
-            ).hexdigest():
-                return {"result": False, "message": f"Block#{block['header']['block_number']} has incorrect hash"}
-
-            prev_block = self.get_block(header["previous_block_hash"])
-            if prev_block["header"]["block_number"] != header["block_number"] - 1:
-                return {"result": False, "message": f"Block#{header['block_number']} with hash {block['block_hash']} "
-                                                    f"points back to an invalid block"}
-
-            if merkle_roots["transactions"]:
-                m_tx = MerkleTree(*list(block["data"]["transactions"].keys()))
-                m_tx.make_tree()
-                if merkle_roots["transactions"] != m_tx.root:
-                    return {"result": False, "message": f"Block#{header['block_number']} with hash "
-                                                        f"{block['block_hash']} has invalid transaction merkle root."
-                                                        f"Expected {m_tx.root}, got {merkle_roots['transactions']}"}
-            if merkle_roots["contracts"]:
-                m_cx = MerkleTree(*list(block["data"]["contracts"].keys()))
-                m_cx.make_tree()
-                if merkle_roots["contracts"] != m_cx.root:
-                    return {"result": False, "message": f"Block#{header['block_number']} with hash "
-                                                        f"{block['block_hash']} has invalid contract merkle root."
-                                                        f"Expected {m_cx.root}, got {merkle_roots['contracts']}"}
-            if merkle_roots["messages"]:
-                m_mx = MerkleTree(*list(block["data"]["messages"].keys()))
-                m_mx.make_tree()
-                if merkle_roots["messages"] != m_mx.root:
-                    return {"result": False, "message": f"Block#{header['block_number']} with hash "
-                                                        f"{block['block_hash']} has invalid message merkle root."
-                                                        f"Expected {m_mx.root}, got {merkle_roots['messages']}"}
-
+    def __verify_range(self, full):
+        """
+        :return: (start, stop, failures) for __verify. stop is fixed here, blocks mined later are left to the next
+                 verification.
+        """
+        with self.__verify_lock:
+            start, failures = 0 if full else self.__verified_height, self.__verify_failures
+        with self.__chain_lock:
+            stop = len(self.__chain)
+        return start, stop, failures
+
+    def __verify(self, start, stop, failures, progress=None):
+        failure = self.__verifier.verify(ChainSnapshot(self.__chain, stop, self.__chain_lock), start, stop,
+                                         progress=progress)
+        with self.__verify_lock:
+            if failure:
+                self.__verified_height = min(self.__verified_height, failure[0])
+                self.__verify_failures += 1
+            elif self.__verify_failures == failures and self.__verified_height >= start:
+                # A verification that failed meanwhile, or a gap below start, must not be skipped over
+                self.__verified_height = max(self.__verified_height, stop)
+        return failure
+
+    def verify_chain(self, full=False):
+        """
+        Check block numbering, hashes, links and merkle roots. Blocks that passed a previous call are not checked
+        again unless full is set.
+
+        :param full: Re-audit the whole chain instead of starting from the last verified block
+        """
+        failure = self.__verify(*self.__verify_range(full))
+        if failure:
+            return {"result": False, "message": failure[1]}
         return {"result": True, "message": "Blocks are valid and consistent"}
+
+    def start_validation(self, full=False):
+        """
+        Run verify_chain in a background thread. Only one validation runs at a time, while one is running its
+        status is returned instead of starting another.
+
+        :param full: Re-audit the whole chain instead of starting from the last verified block
+        :return: Status of the job, see pythereum.validation.ValidationJob.status
+        """
+        for job in self.__validation_jobs.values():
+            if not job.finished:
+                return job.status()
+        start, stop, failures = self.__verify_range(full)
+        job = ValidationJob(lambda progress: self.__verify(start, stop, failures, progress), stop - start)
+        self.__validation_jobs[job.job_id] = job.start()
+        while len(self.__validation_jobs) > 16:
+            self.__validation_jobs.popitem(last=False)
+        return job.status()
+
+    def get_validation(self, job_id):
+        """
+        :param job_id: Id returned by start_validation
+        :return: Status of the job, see pythereum.validation.ValidationJob.status, or None if it is unknown
+        """
+        job = self.__validation_jobs.get(job_id)
+        return job.status() if job else None
@@ -0,0 +1,388 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import weakref
+from array import array
+
+RECORD_HEADER = struct.Struct(">III")  # payload length, payload crc32, block header length
+INDEX_ENTRY = struct.Struct(">IQI")  # segment number, record offset, record length (header included)
+SNAPSHOT_VERSION = 2  # 1 was a pickle, which must never be loaded again
+
+
+class BlockView(dict):
+    """
+    Block read from a FileBlockStore. The header and block hash are decoded eagerly, the data section is only
+    decoded (and checksummed) from the memory-mapped segment the first time it is accessed.
+    """
+
+    def __init__(self, header, block_hash, segment, start, length, header_length, crc):
+        super().__init__(header=header, block_hash=block_hash)
+        self.__segment = segment
+        self.__record = (start, length, header_length, crc)
+
+    @property
+    def loaded(self):
+        return self.__segment is None
+
+    def __load(self):
+        if self.__segment is None:
+            return
+        if self.__segment.closed:
+            raise IOError(f"Block#{self['header']['block_number']} was read from a block store that is closed")
+        start, length, header_length, crc = self.__record
+        payload = self.__segment[start:start + length]
+        if zlib.crc32(payload) != crc:
+            raise IOError(f"Block#{self['header']['block_number']} is corrupted")
+        block_hash = dict.pop(self, "block_hash")
+        dict.__setitem__(self, "data", json.loads(payload[header_length:]))
+        dict.__setitem__(self, "block_hash", block_hash)
+        self.__segment = None
+
+    def __getitem__(self, key):
+        if key == "data":
+            self.__load()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key == "data":
+            self.__load()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return key == "data" or dict.__contains__(self, key)
+
+    def __iter__(self):
+        self.__load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.__load()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.__load()
+        return dict.keys(self)
+
+    def values(self):
+        self.__load()
+        return dict.values(self)
+
+    def items(self):
+        self.__load()
+        return dict.items(self)
+
+    def copy(self):
+        self.__load()
+        return dict(dict.items(self))
+
+    def __eq__(self, other):
+        self.__load()
+        if isinstance(other, BlockView):
+            other.__load()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self.__load()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+class FileBlockStore:
+    """
+    Append-only block storage on disk.
+
+    Blocks are written as length-prefixed, checksummed records to numbered segment files. An offset index with
+    one fixed-width entry per block makes reopening the store proportional to the size of the index rather
+    than to the size of the chain. Index entries are only written once the records they point to have been
+    synced, and records written after the last sync are recovered (or truncated when incomplete) on reopen.
+
+    Implements the sequence interface Pythereum expects from its chain: len(), indexing, iteration and append().
+    Indexing returns a BlockView backed by a memory map of the segment, so only the blocks that are actually
+    used are decoded and kept in memory.
+    """
+
+    def __init__(self, path, *, segment_size=64 * 1024 * 1024, sync_every=1):
+        self.__path = str(path)
+        self.__segment_size = int(segment_size)
+        self.__sync_every = int(sync_every)
+        assert self.__segment_size > 0, "Segment size must be positive"
+        assert self.__sync_every > 0, "sync_every must be positive"
+        os.makedirs(self.__path, exist_ok=True)
+
+        self.__segments = array("I")
+        self.__offsets = array("Q")
+        self.__lengths = array("I")
+        self.__pending = []  # index entries whose records have not been synced yet
+        self.__maps = {}
+        self.__retired = weakref.WeakSet()  # replaced maps still used by views that were not decoded yet
+        self.__closed = False
+
+        self.__recover()
+
+        self.__index = open(self.__index_path, "ab")
+        self.__segment = open(self.__segment_path(self.__segment_number), "ab")
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    @property
+    def __index_path(self):
+        return os.path.join(self.__path, "index")
+
+    @property
+    def __snapshot_path(self):
+        return os.path.join(self.__path, "snapshot")
+
+    def __segment_path(self, number):
+        return os.path.join(self.__path, f"segment-{number:06d}.log")
+
+    def __recover(self):
+        index_size = os.path.getsize(self.__index_path) if os.path.exists(self.__index_path) else 0
+        with open(self.__index_path, "ab+") as index:
+            # Drop a partially written index entry
+            if index_size % INDEX_ENTRY.size:
+                index_size -= index_size % INDEX_ENTRY.size
+                index.truncate(index_size)
+            index.seek(0)
+            raw = index.read(index_size)
+        for segment, offset, length in INDEX_ENTRY.iter_unpack(raw):
+            self.__segments.append(segment)
+            self.__offsets.append(offset)
+            self.__lengths.append(length)
+
+        # Indexed records were synced before their entries were written, but check the last one anyway
+        while len(self) and self.__read_record(len(self) - 1) is None:
+            self.__segments.pop()
+            self.__offsets.pop()
+            self.__lengths.pop()
+        if len(self) < index_size // INDEX_ENTRY.size:
+            with open(self.__index_path, "ab") as index:
+                index.truncate(len(self) * INDEX_ENTRY.size)
+
+        if len(self):
+            number, offset = self.__segments[-1], self.__offsets[-1] + self.__lengths[-1]
+        else:
+            number, offset = 0, 0
+
+        # Recover records that were written after the last index entry, stop at the first incomplete one
+        recovered = []
+        while os.path.exists(self.__segment_path(number)):
+            with open(self.__segment_path(number), "rb") as segment:
+                segment.seek(offset)
+                data = segment.read()
+            position = 0
+            while position + RECORD_HEADER.size <= len(data):
+                length, crc, _ = RECORD_HEADER.unpack_from(data, position)
+                payload = data[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    break
+                recovered.append((number, offset + position, RECORD_HEADER.size + length))
+                position += RECORD_HEADER.size + length
+            if position < len(data):
+                with open(self.__segment_path(number), "ab") as segment:
+                    segment.truncate(offset + position)
+                break
+            if not os.path.exists(self.__segment_path(number + 1)):
+                break
+            number, offset = number + 1, 0
+
+        # Anything past the first damaged record cannot be trusted
+        stale = number + 1
+        while os.path.exists(self.__segment_path(stale)):
+            os.remove(self.__segment_path(stale))
+            stale += 1
+
+        self.__segment_number = number
+        # Segments may have been truncated since they were mapped to check the last indexed record
+        for mapped in self.__maps.values():
+            mapped.close()
+        self.__maps = {}
+        if recovered:
+            with open(self.__index_path, "ab") as index:
+                for entry in recovered:
+                    index.write(INDEX_ENTRY.pack(*entry))
+                    self.__segments.append(entry[0])
+                    self.__offsets.append(entry[1])
+                    self.__lengths.append(entry[2])
+                index.flush()
+                os.fsync(index.fileno())
+
+    def __map(self, number, end):
+        # Segments are mapped once and remapped when the active segment has grown past the mapped length.
+        # Views created from a previous mapping keep it alive until they are decoded or the store is closed.
+        if self.__closed:
+            raise IOError(f"Block store {self.__path} is closed")
+        mapped = self.__maps.get(number)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                self.__retired.add(mapped)
+            with open(self.__segment_path(number), "rb") as segment:
+                mapped = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__maps[number] = mapped
+        return mapped
+
+    def __entry(self, i):
+        if i < len(self.__offsets):
+            return self.__segments[i], self.__offsets[i], self.__lengths[i]
+        # Records that are not synced yet may still sit in the write buffer
+        self.__segment.flush()
+        return self.__pending[i - len(self.__offsets)]
+
+    def __locate(self, i):
+        number, offset, length = self.__entry(i)
+        try:
+            mapped = self.__map(number, offset + length)
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(mapped) < offset + length:
+            return None
+        payload_length, crc, header_length = RECORD_HEADER.unpack_from(mapped, offset)
+        if payload_length != length - RECORD_HEADER.size or header_length > payload_length:
+            return None
+        return mapped, offset + RECORD_HEADER.size, payload_length, header_length, crc
+
+    def __read_record(self, i):
+        record = self.__locate(i)
+        if record is None:
+            return None
+        mapped, start, length, header_length, crc = record
+        payload = mapped[start:start + length]
+        if zlib.crc32(payload) != crc:
+            return None
+        return payload, header_length
+
+    @staticmethod
+    def encode(block):
+        header = json.dumps({"header": block["header"], "block_hash": block["block_hash"]}).encode()
+        data = json.dumps(block["data"]).encode()
+        return header, data
+
+    def __len__(self):
+        return len(self.__offsets) + len(self.__pending)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        i = int(item)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Block number out of range")
+
+        record = self.__locate(i)
+        if record is None:
+            raise IOError(f"Block#{i} is corrupted in {self.__path}")
+        mapped, start, length, header_length, crc = record
+        header = json.loads(mapped[start:start + header_length])
+        return BlockView(header["header"], header["block_hash"], mapped, start, length, header_length, crc)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self[i]
+
+    def append(self, block):
+        if self.__closed:
+            raise IOError(f"Block store {self.__path} is closed")
+        assert block["header"]["block_number"] == len(self), \
+            f"Expected block #{len(self)}, got #{block['header']['block_number']}"
+        header, data = self.encode(block)
+        payload = header + data
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload), len(header)) + payload
+
+        offset = self.__segment.tell()
+        if offset and offset + len(record) > self.__segment_size:
+            self.__roll_segment()
+            offset = 0
+
+        self.__segment.write(record)
+        self.__pending.append((self.__segment_number, offset, len(record)))
+        if len(self.__pending) >= self.__sync_every:
+            self.sync()
+
+    def __roll_segment(self):
+        self.sync()
+        self.__segment.close()
+        self.__segment_number += 1
+        self.__segment = open(self.__segment_path(self.__segment_number), "ab")
+
+    def sync(self):
+        """
+        Make every appended block durable: the segment is synced before the index entries pointing into it
+        """
+        if not self.__pending:
+            return
+        self.__segment.flush()
+        os.fsync(self.__segment.fileno())
+        for entry in self.__pending:
+            self.__index.write(INDEX_ENTRY.pack(*entry))
+            self.__segments.append(entry[0])
+            self.__offsets.append(entry[1])
+            self.__lengths.append(entry[2])
+        self.__index.flush()
+        os.fsync(self.__index.fileno())
+        self.__pending = []
+
+    def write_snapshot(self, state):
+        """
+        Store a JSON serializable state object next to the chain, tagged with the format version and the current
+        height. Written to a temporary file and renamed, so a crash never leaves a half written snapshot.
+        """
+        self.sync()
+        tmp_path = self.__snapshot_path + ".tmp"
+        with open(tmp_path, "w") as snapshot:
+            json.dump({"version": SNAPSHOT_VERSION, "height": len(self),
+                       "block_hash": self[-1]["block_hash"] if len(self) else None, "state": state}, snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_path, self.__snapshot_path)
+
+    def read_snapshot(self):
+        """
+        :return: (height, state) of the last snapshot, or None if there is none, it is unreadable, of another
+                 version or does not match the chain
+        """
+        if not os.path.exists(self.__snapshot_path):
+            return None
+        try:
+            with open(self.__snapshot_path, "rb") as snapshot:
+                snapshot = json.loads(snapshot.read().decode("utf-8"))
+            if snapshot.get("version") != SNAPSHOT_VERSION:
+                return None
+            height = int(snapshot["height"])
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        if not height or height > len(self) or self[height - 1]["block_hash"] != snapshot.get("block_hash"):
+            return None
+        return height, snapshot["state"]
+
+    def close(self):
+        """
+        Sync and close the files and memory maps of the store. Blocks that were read but not decoded yet can no
+        longer be decoded afterwards.
+        """
+        if self.__closed:
+            return
+        self.sync()
+        self.__segment.close()
+        self.__index.close()
+        for mapped in [*self.__maps.values(), *self.__retired]:
+            mapped.close()
+        self.__maps = {}
+        self.__retired = weakref.WeakSet()
+        self.__closed = True
@@ -1,9 +1,41 @@
 import time
 import hashlib
 
+from pythereum import codec
 from pythereum.compile import CompileContract
 from pythereum.wallet import verify_signature
 
+# Version 1 signed only the amount and the sender, version 2 added the fee, version 3 covers every field the
+# sender chooses: amount, sender, fee, recipient, inputs and data
+SIGNATURE_VERSION = 3
+SIGNATURE_VERSIONS = (1, 2, 3)
+
+
+def signed_item(value, t_from, fee=0.0, version=SIGNATURE_VERSION, *, t_to=None, input_txids=(), data=None):
+    """
+    String a sender signs to authorise a transaction
+
+    :param value: Amount as it is passed to Transaction
+    :param t_from: Sender
+    :param fee: Fee paid to the miner, not covered by version 1
+    :param version: Format of the string, 1 or 2 for transactions signed before version 3
+    :param t_to: Recipient, only covered by version 3
+    :param input_txids: Ids of the outputs spent, only covered by version 3, in any order
+    :param data: Data field of the transaction, only covered by version 3
+    :return: str to pass to pythereum.wallet.sign_item
+    """
+    if version == 1:
+        return f"{value}{t_from}"
+    if version == 2:
+        return f"2:{value}:{t_from}:{float(fee)!r}"
+    if version == 3:
+        assert t_to is not None, "Version 3 signatures cover the recipient"
+        if isinstance(input_txids, str):
+            input_txids = [input_txids]
+        # data comes last, it is the only field that may contain the separator
+        return f"3:{value}:{t_from}:{float(fee)!r}:{t_to}:{','.join(sorted(input_txids))}:{data}"
+    raise ValueError(f"Unknown signature version {version}")
+
 
 class Transaction:
     """
@@ -11,16 +43,21 @@ class Transaction:
     message / notes.
     """
 
-    def __init__(self, t_from, t_to, value, signature, input_txids, *, data=None):
+    def __init__(self, t_from, t_to, value, signature, input_txids, *, data=None, fee=0.0,
+                 signature_version=SIGNATURE_VERSION):
         self.__from = str(t_from)
         self.__to = str(t_to)
         self.__amount = float(value)
+        self.__signed_amount = str(value)
+        self.__fee = float(fee)
         self.__data = str(data)
         self.__signature = str(signature)
+        self.__signature_version = int(signature_version)
 
         assert self.__amount > 0, "Invalid amount to send"
-        assert verify_signature(signature=self.__signature, item=f"{value}{t_from}", public_key=self.__from), \
-            "Invalid Signature"
+        assert self.__fee >= 0, "Invalid fee"
+        assert self.__signature_version in SIGNATURE_VERSIONS, "Unknown signature version"
+        assert self.__signature_version > 1 or not self.__fee, "A fee requires a version 2 signature"
 
         self.__time = None
 
@@ -31,9 +68,16 @@ class Transaction:
         else:
             self.__input_txids = []
 
+        assert verify_signature(signature=self.__signature,
+                                item=signed_item(self.__signed_amount, self.__from, self.__fee,
+                                                 self.__signature_version, t_to=self.__to,
+                                                 input_txids=self.__input_txids, data=self.__data),
+                                public_key=self.__from), \
+            "Invalid Signature"
+
         self.__time = time.time()
 
-        self.__txid = hashlib.sha256(f"{self.__from}{self.__to}{self.__amount}{self.__time}"
+        self.__txid = hashlib.sha256(f"{self.__from}{self.__to}{self.__amount}{self.__fee}{self.__time}"
                                      f"{''.join(self.__input_txids)}".encode()
                                      ).hexdigest()
 
@@ -53,6 +97,10 @@ class Transaction:
     def amount(self):
         return self.__amount
 
+    @property
+    def fee(self):
+        return self.__fee
+
     @property
     def signature(self):
         return self.__signature
@@ -68,11 +116,17 @@ class Transaction:
             "time": self.__time,
             "signature": self.__signature,
             "amount": self.__amount,
+            "signed_amount": self.__signed_amount,
+            "signature_version": self.__signature_version,
+            "fee": self.__fee,
             "txid": self.txid,
             "input_txids": self.input_txids,
             "data": self.__data
         }
 
+    def encode(self):
+        return codec.encode_transaction(self.jsonify())
+
 
 class Contract:
     def __init__(self, code, t_from, signature):
@@ -98,6 +152,7 @@ class Contract:
             "cxid": self.__cxid,
             "from": self.__from,
             "time": self.__time,
+            "signature": self.__signature,
             "code": self.__code,
             "state": {
                 "state_vars": self.__state["state_vars"],
@@ -105,6 +160,9 @@ class Contract:
             }
         }
 
+    def encode(self):
+        return codec.encode_contract(self.jsonify())
+
 
 class Message:
     """
@@ -140,3 +198,6 @@ class Message:
                 "reply": None
             }
         }
+
+    def encode(self):
+        return codec.encode_message(self.jsonify())
@@ -0,0 +1,337 @@
+import os
+import math
+import time
+import hashlib
+import secrets
+import threading
+import multiprocessing
+
+from pythereum.block import MerkleTree, hash_header, merkle_mode
+from pythereum.wallet import verify_batch
+from pythereum.transaction import signed_item
+
+CHUNK_SIZE = 256
+
+
+def verify_block(block, previous_block, expected_number):
+    """
+    Check a single jsonified block on its own and against the block before it
+
+    :param block: Block to check
+    :param previous_block: Block expected_number - 1 of the chain, None for the genesis block
+    :param expected_number: Position of block in the chain
+    :return: None if the block is valid, an error message otherwise
+    """
+    header = block["header"]
+    merkle_roots = header["merkle_root"]
+
+    if header["block_number"] != expected_number:
+        return f"Inconsistent block numbering. Expected #{expected_number} for block with hash " \
+               f"{block['block_hash']} but got #{header['block_number']}"
+    if not header["block_number"]:
+        return None
+
+    if block["block_hash"] != hash_header(header):
+        return f"Block#{header['block_number']} has incorrect hash"
+
+    if previous_block is None or previous_block["block_hash"] != header["previous_block_hash"]:
+        return f"Block#{header['block_number']} with hash {block['block_hash']} points back to an invalid block"
+
+    mode = merkle_mode(header.get("version", 1))
+    for mtype, name in (("transactions", "transaction"), ("contracts", "contract"), ("messages", "message")):
+        if merkle_roots[mtype]:
+            tree = MerkleTree(*list(block["data"][mtype] or ()), mode=mode)
+            tree.make_tree()
+            if merkle_roots[mtype] != tree.root:
+                return f"Block#{header['block_number']} with hash {block['block_hash']} has invalid {name} " \
+                       f"merkle root.Expected {tree.root}, got {merkle_roots[mtype]}"
+    return None
+
+
+def signed_items(block):
+    """
+    :param block: Jsonified block
+    :return: List of (signature, item, public_key, description) for every signed transaction and contract of the
+             block. Change and fee transactions are created by the miner and carry no signature, transactions
+             recorded before the signed amount was kept cannot be checked again.
+    """
+    items = []
+    for txid, tx in (block["data"]["transactions"] or {}).items():
+        if tx.get("signature", "null") != "null" and "signed_amount" in tx:
+            item = signed_item(tx["signed_amount"], tx["from"], tx.get("fee", 0.0), tx.get("signature_version", 1),
+                               t_to=tx["to"], input_txids=tx["input_txids"], data=tx.get("data"))
+            items.append((tx["signature"], item, tx["from"], f"transaction {txid}"))
+    for cxid, cx in (block["data"]["contracts"] or {}).items():
+        if "signature" in cx:
+            items.append((cx["signature"], cx["code"], cx["from"], f"contract {cxid}"))
+    return items
+
+
+def transaction_id(tx):
+    """
+    :param tx: Jsonified signed transaction
+    :return: txid recomputed from the fields of tx the way Transaction computes it, using the signed amount as
+             mining replaces the amount with the input total
+    """
+    return hashlib.sha256(f"{tx['from']}{tx['to']}{float(tx['signed_amount'])}{float(tx.get('fee', 0.0))}"
+                          f"{tx['time']}{''.join(tx['input_txids'])}".encode()).hexdigest()
+
+
+def check_txids(block):
+    """
+    The signature of a version 3 transaction covers its recipient, the txid ties the recipient of older versions
+    to the time of the transaction only. Checking the txid of every signed transaction catches fields rewritten
+    after signing, a recipient of a version 1 or 2 transaction rewritten together with its txid is not caught.
+
+    :param block: Jsonified block
+    :return: None if the txid of every signed transaction matches its fields, an error message otherwise
+    """
+    block_number = block["header"]["block_number"]
+    for txid, tx in (block["data"]["transactions"] or {}).items():
+        if tx.get("signature", "null") == "null" or "signed_amount" not in tx:
+            continue
+        if txid != tx["txid"] or txid != transaction_id(tx):
+            return f"Block#{block_number} has transaction {txid} with a txid that does not match its fields"
+    return None
+
+
+def check_amounts(block):
+    """
+    A signature only covers the amount and fee the sender signed for. Once mined, the amount of a transaction is
+    its input total and the miner adds change and fee transactions taking back the rest, so these have to add up
+    to the signed values.
+
+    :param block: Jsonified block
+    :return: None if every signed transaction moves what its sender signed for, an error message otherwise
+    """
+    block_number = block["header"]["block_number"]
+    transactions = block["data"]["transactions"] or {}
+    change, fees = {}, {}  # txid => amount of the change / fee transaction created for it
+    for txid, tx in transactions.items():
+        for key, created in (("change_from", change), ("fee_from", fees)):
+            if key in tx:
+                if tx[key] not in transactions or tx[key] in created:
+                    return f"Block#{block_number} has {key} transaction {txid} without a transaction to pay for it"
+                created[tx[key]] = tx["amount"]
+
+    for txid, tx in transactions.items():
+        if tx.get("signature", "null") == "null" or "signed_amount" not in tx:
+            continue
+        fee = fees.get(txid, 0.0)
+        if fee and fee != tx.get("fee", 0.0):
+            return f"Block#{block_number} pays a fee of {fee} for transaction {txid}, signed for {tx.get('fee', 0.0)}"
+        moved = tx["amount"] - change.get(txid, 0.0) - fee
+        if not math.isclose(moved, float(tx["signed_amount"]), rel_tol=1e-9, abs_tol=1e-9):
+            return f"Block#{block_number} transaction {txid} moves {moved}, signed for {tx['signed_amount']}"
+    return None
+
+
+def verify_signatures(start, blocks):
+    """
+    :param start: Block number of blocks[0]
+    :param blocks: Consecutive jsonified blocks
+    :return: (block_number, message) of the first block with an invalid signature, a txid that does not match
+             its transaction (see check_txids) or amounts that differ from the signed ones (see check_amounts),
+             None if there is none
+    """
+    failure = None
+    for block_number, block in enumerate(blocks, start):
+        message = block_number and (check_txids(block) or check_amounts(block))
+        if message:
+            failure = block_number, message
+            break
+    items = [(block_number, item) for block_number, block in enumerate(blocks, start) if block_number
+             for item in signed_items(block)]
+    for (block_number, (_, _, _, description)), valid in zip(items, verify_batch(item[:3] for _, item in items)):
+        if not valid:
+            if failure and failure[0] < block_number:
+                break
+            return block_number, f"Block#{block_number} has an invalid signature on {description}"
+    return failure
+
+
+def verify_range(start, blocks, signatures=False):
+    """
+    :param start: Block number of blocks[1], or 0 when blocks starts with the genesis block
+    :param blocks: Consecutive blocks, starting with the block before start unless start is 0
+    :param signatures: Also check the signatures of the transactions and contracts in the blocks
+    :return: (block_number, message) of the first invalid block or None if all blocks are valid
+    """
+    previous_block = None
+    if start:
+        previous_block, blocks = blocks[0], blocks[1:]
+    failure = None
+    for block_number, block in enumerate(blocks, start):
+        message = verify_block(block, previous_block, block_number)
+        if message:
+            failure = block_number, message
+            break
+        previous_block = block
+    if signatures:
+        # All signatures of the range are checked in one batch, only those before a structural failure count
+        checked = blocks[:failure[0] - start] if failure else blocks
+        return verify_signatures(start, checked) or failure
+    return failure
+
+
+def _verify_chunk(args):
+    return verify_range(*args)
+
+
+class ChainSnapshot:
+    """
+    The first length blocks of a chain that may be appended to while they are read. Supports len() and slicing,
+    which is all ChainVerifier needs. Every read holds lock, the lock the owner of the chain holds while appending.
+    """
+
+    def __init__(self, chain, length, lock):
+        self.__chain = chain
+        self.__length = length
+        self.__lock = lock
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("ChainSnapshot only supports slicing")
+        with self.__lock:
+            return self.__chain[slice(*item.indices(self.__length))]
+
+
+class ChainVerifier:
+    """
+    Verifies header hashes, links and merkle roots of a chain. The chain is split into chunks of chunk_size
+    blocks, which are checked across a pool of worker processes. With a single worker the chunks are checked in
+    the calling process, workers=None uses every core.
+
+    With signatures set the signatures of the transactions and contracts are verified as well, one batch per chunk,
+    the txids of signed transactions are recomputed from their fields and the amounts they move are checked
+    against the signed ones. Only version 3 signatures cover the recipient, the recipient of a transaction signed
+    with version 1 or 2 is checked against its txid alone.
+
+    verify may run in a background thread of a node, so the pool can be forked while other threads hold locks.
+    This is safe because the workers only run _verify_chunk on the chunks they receive pickled through the pool
+    queue. They never touch the node, its chain or its locks.
+    """
+
+    def __init__(self, workers=1, chunk_size=CHUNK_SIZE, signatures=False):
+        self.__workers = int(workers) if workers is not None else os.cpu_count() or 1
+        self.__chunk_size = int(chunk_size)
+        self.__signatures = bool(signatures)
+        assert self.__workers > 0, "Verifier needs at least one worker"
+        assert self.__chunk_size > 0, "Chunk size must be positive"
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    @property
+    def signatures(self):
+        return self.__signatures
+
+    def __chunks(self, chain, start, stop):
+        for lo in range(start, stop, self.__chunk_size):
+            hi = min(lo + self.__chunk_size, stop)
+            yield lo, chain[max(lo - 1, 0):hi], self.__signatures
+
+    def verify(self, chain, start=0, stop=None, progress=None):
+        """
+        :param chain: Sequence of jsonified blocks, supporting len() and slicing
+        :param start: First block number to verify, the blocks before it are trusted
+        :param stop: Block number to stop before, defaults to the length of the chain
+        :param progress: Called with the number of blocks verified so far after every chunk
+        :return: (block_number, message) of the first invalid block or None if the blocks are valid
+        """
+        stop = len(chain) if stop is None else min(stop, len(chain))
+        if start >= stop:
+            return None
+        chunks = self.__chunks(chain, start, stop)
+        if self.__workers == 1 or stop - start <= self.__chunk_size:
+            return self.__collect(map(_verify_chunk, chunks), start, stop, progress)
+        with multiprocessing.Pool(self.__workers) as pool:
+            # Results come back in chain order, so the first failure is the lowest invalid block
+            failure = self.__collect(pool.imap(_verify_chunk, chunks), start, stop, progress)
+            pool.terminate()
+        return failure
+
+    def __collect(self, results, start, stop, progress):
+        for i, failure in enumerate(results):
+            if failure:
+                return failure
+            if progress:
+                progress(min((i + 1) * self.__chunk_size, stop - start))
+        return None
+
+
+class ValidationJob:
+    """
+    Runs a chain verification in a background thread and keeps track of its progress.
+
+    verify is called with a progress callback taking the number of blocks verified so far, and returns
+    (block_number, message) of the first invalid block or None, like ChainVerifier.verify.
+    """
+
+    def __init__(self, verify, total):
+        self.__id = secrets.token_hex(8)
+        self.__total = total
+        self.__verified = 0
+        self.__failure = None
+        self.__error = None
+        self.__started = time.time()
+        self.__finished = None
+        self.__thread = threading.Thread(target=self.__run, args=(verify,), daemon=True)
+
+    @property
+    def job_id(self):
+        return self.__id
+
+    @property
+    def finished(self):
+        return self.__finished is not None
+
+    def start(self):
+        self.__thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        self.__thread.join(timeout)
+        return self.finished
+
+    def __progress(self, verified):
+        self.__verified = verified
+
+    def __run(self, verify):
+        try:
+            self.__failure = verify(self.__progress)
+            if not self.__failure:
+                self.__verified = self.__total
+        except Exception as e:
+            self.__error = str(e)
+        finally:
+            self.__finished = time.time()
+
+    def status(self):
+        """
+        :return: Dictionary -> {"job_id", "state", "blocks_verified", "blocks_total", "blocks_per_second",
+                 "seconds", "result", "message", "first_failure"}. state is "running" or "finished", result is
+                 None while running.
+        """
+        finished = self.__finished
+        seconds = (finished or time.time()) - self.__started
+        verified = self.__verified
+        status = {"job_id": self.__id, "state": "finished" if finished else "running",
+                  "blocks_verified": verified, "blocks_total": self.__total,
+                  "blocks_per_second": verified / seconds if seconds else 0.0, "seconds": seconds,
+                  "result": None, "message": None, "first_failure": None}
+        if not finished:
+            return status
+        if self.__error:
+            status.update(result=False, message=f"Validation failed to run. ERROR: {self.__error}")
+        elif self.__failure:
+            block_number, message = self.__failure
+            status.update(result=False, message=message,
+                          first_failure={"block_number": block_number, "message": message})
+        else:
+            status.update(result=True, message="Blocks are valid and consistent")
+        return status
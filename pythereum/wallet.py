@@ -1,15 +1,69 @@
 import os
+import atexit
 import random
 import binascii
+import functools
+import threading
+import multiprocessing
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 from pythereum.ecdsa import SigningKey, VerifyingKey, BadSignatureError, NIST192p
 from pythereum.ecdsa.util import PRNG
 
 SEED_WORD_COUNT = 24
+KEY_CACHE_SIZE = 1024
 ROOT_DIR = Path(os.path.dirname(__file__))
 
+_verify_pool = None  # (workers, multiprocessing.Pool) kept between verify_batch calls
+_verify_pool_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _verifying_key(public_key):
+    # Decoding validates the point (including a full n * point scalar multiplication), so it is only paid once per key
+    return VerifyingKey.from_string(binascii.a2b_base64(public_key), curve=NIST192p)
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _signing_key(private_key):
+    return SigningKey.from_string(binascii.a2b_base64(private_key), curve=NIST192p)
+
+
+def _verify_group(group):
+    public_key, signed = group
+    try:
+        key = _verifying_key(public_key)
+    except (binascii.Error, AssertionError, ValueError):
+        return [False] * len(signed)
+    results = []
+    for signature, item in signed:
+        try:
+            results.append(key.verify(binascii.a2b_base64(signature), item.encode()))
+        except (BadSignatureError, binascii.Error, AssertionError, ValueError):
+            results.append(False)
+    return results
+
+
+def key_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    :return: Dictionary -> {"verifying_keys": {"hits", "misses", "size", "max_size"},
+                            "signing_keys": {"hits", "misses", "size", "max_size"}}
+    """
+    stats = {}
+    for name, cache in (("verifying_keys", _verifying_key), ("signing_keys", _signing_key)):
+        info = cache.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+    return stats
+
+
+def clear_key_cache():
+    """
+    Drops all decoded keys and resets the hit and miss counters
+    """
+    _verifying_key.cache_clear()
+    _signing_key.cache_clear()
+
 
 def generate_wallet(*seed: str) -> Dict[str, str]:
     """
@@ -46,8 +100,7 @@ def generate_public_key(private_key: str) -> str:
     :param private_key: Private Key
     :return str: Public Key corresponding to that private key
     """
-    private_key = SigningKey.from_string(binascii.a2b_base64(private_key), curve=NIST192p)
-    return private_key.get_verifying_key().to_pem().decode("utf-8")
+    return _signing_key(private_key).get_verifying_key().to_pem().decode("utf-8")
 
 
 def sign_item(private_key, item):
@@ -59,8 +112,7 @@ def sign_item(private_key, item):
     :return str: a base64 encoded representation of the signature
     """
 
-    private_key = SigningKey.from_string(binascii.a2b_base64(private_key), curve=NIST192p)
-    signed_item = private_key.sign_deterministic(item.encode())
+    signed_item = _signing_key(private_key).sign_deterministic(item.encode())
 
     return binascii.b2a_base64(signed_item, newline=False).decode("utf-8")
 
@@ -75,7 +127,7 @@ def verify_signature(signature, item, public_key) -> bool:
     :param public_key: Public key
     :return: bool indicating if the signature is correct or not
     """
-    public_key = VerifyingKey.from_string(binascii.a2b_base64(public_key), curve=NIST192p)
+    public_key = _verifying_key(public_key)
     signature = binascii.a2b_base64(signature)
 
     try:
@@ -95,7 +147,65 @@ def verify_key_pair(public_key, private_key) -> bool:
     :return: bool indicating if the key pair is correct or not
     """
 
-    private_key = SigningKey.from_string(binascii.a2b_base64(private_key), curve=NIST192p)
-    expected_public_key = private_key.get_verifying_key()
+    expected_public_key = _signing_key(private_key).get_verifying_key()
 
     return binascii.b2a_base64(expected_public_key.to_string(), newline=False).decode("utf-8") == public_key
+
+
+def _pool(workers):
+    global _verify_pool
+    with _verify_pool_lock:
+        if _verify_pool is None or _verify_pool[0] != workers:
+            if _verify_pool is not None:
+                _verify_pool[1].terminate()
+            else:
+                atexit.register(close_verify_pool)
+            _verify_pool = (workers, multiprocessing.Pool(workers))
+        return _verify_pool[1]
+
+
+def close_verify_pool():
+    """
+    Stops the worker processes kept by verify_batch, the next call with workers > 1 starts new ones
+    """
+    global _verify_pool
+    with _verify_pool_lock:
+        if _verify_pool is not None:
+            _verify_pool[1].terminate()
+            _verify_pool[1].join()
+            _verify_pool = None
+
+
+def verify_batch(items, workers=1) -> List[bool]:
+    """
+    Verifies many signatures and reports every result, so malformed keys or signatures only fail their own items.
+
+    Within one process this is only a grouping wrapper around verify_signature: decoded keys and their
+    precomputed multiples are cached across calls, so one at a time verification gets the same savings. The
+    speedup comes from workers > 1, which spreads the keys over a pool of processes. The pool is kept between
+    calls, together with the key cache of every worker, until the number of workers changes or
+    close_verify_pool is called.
+
+    :param items: Iterable of (signature, item, public_key), the arguments of verify_signature
+    :param workers: Number of worker processes, None for every core
+    :return: List of bools, one per item in the order given
+    """
+    workers = int(workers) if workers is not None else os.cpu_count() or 1
+    assert workers > 0, "verify_batch needs at least one worker"
+
+    items = list(items)
+    groups = {}  # public_key => indexes of its items
+    for i, (_, _, public_key) in enumerate(items):
+        groups.setdefault(public_key, []).append(i)
+    jobs = [(public_key, [items[i][:2] for i in indexes]) for public_key, indexes in groups.items()]
+
+    if workers > 1 and len(jobs) > 1:
+        group_results = _pool(workers).map(_verify_group, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+    else:
+        group_results = map(_verify_group, jobs)
+
+    results = [False] * len(items)
+    for indexes, group_result in zip(groups.values(), group_results):
+        for i, result in zip(indexes, group_result):
+            results[i] = result
+    return results
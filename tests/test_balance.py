@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+from pythereum import generate_wallet, Pythereum
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+
+pth = Pythereum(0, checkpoint_interval=3)
+
+print("Recording balances after every block")
+history = [(pth.get_balance(w1["public_key"]), pth.get_balance(w2["public_key"]))]
+for i in range(7):
+    if i % 3 == 2:
+        pth.send_pth(w2["public_key"], w1["public_key"], 1, w2["private_key"])
+    else:
+        pth.send_pth(w1["public_key"], w2["public_key"], 5, w1["private_key"])
+    pth.mine_block()
+    history.append((pth.get_balance(w1["public_key"]), pth.get_balance(w2["public_key"])))
+print(history)
+
+print("Checking historical balances against the recorded values")
+for block_number, (b1, b2) in enumerate(history):
+    assert pth.get_balance(w1["public_key"], block_number) == b1, block_number
+    assert pth.get_balance(w2["public_key"], block_number) == b2, block_number
+assert pth.get_balance(w2["public_key"]) == history[-1][1]
+assert pth.get_balance(generate_wallet()["public_key"], 3) == 0
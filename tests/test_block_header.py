@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+
+import hashlib
+
+from pythereum.block import Block, hash_header
+from pythereum.difficulty import target_from_difficulty
+from pythereum.miner import Miner
+
+print("Mining blocks with the legacy and the current header layout")
+for version in (1, 2):
+    block = Block(block_number=1, block_nonce="0" * 32, previous_block_hash="ab" * 32, version=version)
+    Miner().mine(block, target_from_difficulty(3))
+    header = block.jsonify()["header"]
+    assert block.hash.startswith("000") and block.validate()
+    assert hash_header(header) == block.hash
+    assert ("version" in header) == (version > 1)
+
+    if version == 1:
+        merkle_roots = header["merkle_root"]
+        assert block.hash == hashlib.sha256(
+            f"{header['block_number']}{header['block_time']}{header['block_nonce']}"
+            f"{header['previous_block_hash']}{merkle_roots['transactions']}{merkle_roots['contracts']}"
+            f"{merkle_roots['messages']}".encode()).hexdigest()
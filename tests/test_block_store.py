@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pickle
+import tempfile
+
+from pythereum import generate_wallet, Pythereum
+from pythereum.storage import FileBlockStore
+
+
+class Exploit:
+    """
+    Creates a directory when unpickled
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (os.path.join(self.path, "pwned"),)
+
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+
+with tempfile.TemporaryDirectory() as data_dir:
+    print("Mining a few blocks into an on-disk block store")
+    pth = Pythereum(0, store=FileBlockStore(data_dir, segment_size=2048))
+    for i in range(4):
+        pth.send_pth(w1["public_key"], w2["public_key"], 5, w1["private_key"])
+        pth.mine_block()
+    blocks = [block.copy() for block in pth.blocks]  # decoded, views cannot be read once the store is closed
+    balance = pth.get_balance(w2["public_key"])
+    pth.close()
+    assert len([f for f in os.listdir(data_dir) if f.startswith("segment")]) > 1
+
+    print("Reopening the chain")
+    pth = Pythereum(0, store=FileBlockStore(data_dir))
+    assert pth.blocks == blocks
+    assert pth.get_balance(w2["public_key"]) == balance
+    assert pth.get_block(blocks[2]["block_hash"]) == blocks[2]
+    block = pth[3]
+    assert block["header"]["block_number"] == 3 and not block.loaded
+    assert block["data"] == blocks[3]["data"] and block.loaded
+    assert pth.verify_chain()["result"]
+    assert pth.verify_utxo()["result"]
+    pth.send_pth(w2["public_key"], w1["public_key"], 3, w2["private_key"])
+    pth.mine_block()
+    blocks = [block.copy() for block in pth.blocks]
+    pth.close()
+
+    print("Recovering blocks written after the last sync and dropping a torn record")
+    store = FileBlockStore(data_dir, sync_every=100)
+    pth = Pythereum(0, store=store)
+    pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+    pth.mine_block()
+    blocks = [block.copy() for block in pth.blocks]
+    segment = sorted(f for f in os.listdir(data_dir) if f.startswith("segment"))[-1]
+    with open(os.path.join(data_dir, segment), "ab") as f:
+        f.write(b"\x00\x00\x10\x00torn")
+
+    recovered = FileBlockStore(data_dir)
+    assert len(recovered) == len(blocks)
+    assert list(recovered) == blocks
+    pth = Pythereum(0, store=recovered)
+    assert pth.verify_utxo()["result"]
+    pth.close()
+
+    print("Restoring indexes from the JSON snapshot with the current parameters")
+    pth = Pythereum(0, store=FileBlockStore(data_dir))
+    history = [pth.get_balance(w2["public_key"], n) for n in range(len(blocks))]
+    utxo = pth.get_utxo(w2["public_key"])
+    pth.close()
+    with open(os.path.join(data_dir, "snapshot")) as f:
+        snapshot = json.load(f)
+    assert snapshot["version"] == 2 and snapshot["height"] == len(blocks)
+    assert snapshot["state"]["balances"]["checkpoint_interval"] == 100
+    for interval in (100, 2):
+        pth = Pythereum(0, store=FileBlockStore(data_dir), checkpoint_interval=interval)
+        assert [pth.get_balance(w2["public_key"], n) for n in range(len(blocks))] == history
+        assert pth.get_utxo(w2["public_key"]) == utxo
+        assert pth.get_transaction_location(next(iter(blocks[2]["data"]["transactions"]))) == (2, 0)
+        assert pth.verify_utxo()["result"]
+        pth.close()
+        with open(os.path.join(data_dir, "snapshot")) as f:
+            assert json.load(f)["state"]["balances"]["checkpoint_interval"] == interval
+
+    print("Ignoring snapshots that are not JSON")
+    with open(os.path.join(data_dir, "snapshot"), "wb") as f:
+        pickle.dump({"height": len(blocks), "block_hash": blocks[-1]["block_hash"], "state": Exploit(data_dir)}, f)
+    store = FileBlockStore(data_dir)
+    assert store.read_snapshot() is None
+    pth = Pythereum(0, store=store)
+    assert not os.path.exists(os.path.join(data_dir, "pwned"))
+    assert [pth.get_balance(w2["public_key"], n) for n in range(len(blocks))] == history
+    pth.close()
+
+    print("Closing the memory maps with the store")
+    store = FileBlockStore(data_dir, sync_every=100)
+    pth = Pythereum(0, store=store)
+    old_view = store[1]
+    pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+    pth.mine_block()
+    new_view, decoded = store[2], store[3]
+    assert decoded["data"] and store[-1]["data"]  # remaps the segment written to since store[1] was read
+    pth.close()
+    assert store.closed and decoded.loaded and decoded["data"]
+    for view in (old_view, new_view):
+        try:
+            view["data"]
+            assert False, "Read a block from a closed store"
+        except IOError as e:
+            assert "closed" in str(e)
+    for read in (lambda: store[0], lambda: store.append(blocks[0])):
+        try:
+            read()
+            assert False, "Used a closed store"
+        except IOError as e:
+            assert "closed" in str(e)
+    store.close()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import json
+
+from pythereum import codec, generate_wallet, Pythereum
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+
+pth = Pythereum(0)
+
+print("Round-tripping mined blocks through the binary codec")
+for i in range(3):
+    pth.send_pth(w1["public_key"], w2["public_key"], 5, w1["private_key"])
+    pth.mine_block()
+
+for block in pth.blocks:
+    encoded = codec.encode_block(block)
+    assert codec.decode_block(encoded) == block
+    assert json.dumps(codec.decode_block(encoded)) == json.dumps(block)
+    assert len(encoded) < len(json.dumps(block))
+    for tx in block["data"]["transactions"].values():
+        assert codec.decode_transaction(codec.encode_transaction(tx)) == tx
+
+value = {"state_vars": {"n": -12345678901234567890, "ok": True, "s": "né", "l": [1.5, None, "abc"]}}
+assert codec.decode(codec.MESSAGE, codec.encode(codec.MESSAGE, value)) == value
+
+try:
+    codec.decode_transaction(codec.encode_block(pth.top_block))
+    assert False, "Decoded a block as a transaction"
+except codec.CodecError:
+    pass
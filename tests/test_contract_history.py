@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+from pythereum import Pythereum, generate_wallet
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+
+pth = Pythereum(0)
+code = """
+count = 0
+
+def main():
+    state("count", state("count") + 1)
+    print("count " + str(state("count")))
+    return state(), printed
+"""
+
+print("Deploying a counter contract")
+pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+before_deploy = pth.mine_block()["header"]["block_number"]
+cx = pth.create_contract(code, w1["public_key"], w1["private_key"])
+deployed = pth.mine_block()["header"]["block_number"]
+cxid = cx["cxid"]
+
+contract = pth.get_contract(cxid)
+assert contract["code"] == code and contract["from"] == w1["public_key"]
+assert cxid in pth.get_block(deployed)["data"]["contracts"]
+assert pth.get_contract("0" * 64) is None
+
+print("Calling it in two blocks with an unrelated block in between")
+pth.call_contract(cxid, 10000, None, w2["public_key"], w2["private_key"])
+first_call = pth.mine_block()["header"]["block_number"]
+pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+between = pth.mine_block()["header"]["block_number"]
+pth.call_contract(cxid, 10000, None, w1["public_key"], w1["private_key"])
+second_call = pth.mine_block()["header"]["block_number"]
+
+print("Checking the state as of every block")
+assert pth.get_contract_state(cxid, before_deploy) is None
+assert pth.get_contract_state(cxid, deployed) == {"count": 0}
+assert pth.get_contract_state(cxid, first_call) == {"count": 1}
+assert pth.get_contract_state(cxid, between) == {"count": 1}
+assert pth.get_contract_state(cxid, second_call) == {"count": 2}
+assert pth.get_contract_state(cxid) == {"count": 2}
+assert pth.get_contract_state("0" * 64) is None
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+from pythereum import Pythereum, generate_wallet
+from pythereum.difficulty import Difficulty, target_from_difficulty, MAX_TARGET
+
+print("Checking targets against leading zero difficulty")
+for difficulty in range(0, 6):
+    target = target_from_difficulty(difficulty)
+    assert int("0" * difficulty + "f" * (64 - difficulty), 16) == target
+    assert Difficulty(difficulty).difficulty == difficulty
+assert target_from_difficulty(0) == MAX_TARGET
+assert target_from_difficulty(3) < target_from_difficulty(2.5) < target_from_difficulty(2)
+
+
+def headers(times):
+    return [{"header": {"block_number": i, "block_time": t}} for i, t in enumerate(times)]
+
+
+print("Retargeting from observed block times")
+fast = Difficulty(2, block_time=10, retarget_interval=5)
+for block in headers([i * 5.0 for i in range(6)]):
+    fast.add_block(block)
+assert fast.target == target_from_difficulty(2) // 2
+
+slow = Difficulty(2, block_time=10, retarget_interval=5, max_adjustment=4)
+for block in headers([i * 1000.0 for i in range(6)]):
+    slow.add_block(block)
+assert slow.target == target_from_difficulty(2) * 4
+
+fixed = Difficulty(2)
+for block in headers([i * 5.0 for i in range(6)]):
+    fixed.add_block(block)
+assert fixed.target == target_from_difficulty(2)
+
+print("Mining faster than the block time raises the difficulty")
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+pth = Pythereum(1, block_time=60, retarget_interval=2)
+for i in range(4):
+    pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+    pth.mine_block()
+    assert int(pth.top_block["block_hash"], 16) <= target_from_difficulty(1)
+assert pth.difficulty == 2
+assert pth.verify_chain()["result"]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import json
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from pythereum import Pythereum, generate_wallet
+from pythereum.api import api
+from pythereum.api.bottle import default_app
+
+w1 = generate_wallet("bob", "the", "builder")
+
+pth = Pythereum(0)
+pth.create_contract("""
+def main(x):
+    print(("even " if x % 2 == 0 else "odd ") + str(x))
+    print("call " + str(x))
+    return state(), printed
+""", w1["public_key"], w1["private_key"])
+pth.mine_block()
+cxid = next(iter(pth.top_block["data"]["contracts"]))
+
+print("Calling the contract over several blocks, some with more than one message")
+for calls in ((1, 2), (3,), (4, 5, 6), (7,)):
+    for x in calls:
+        pth.call_contract(cxid, 5000, x, w1["public_key"], w1["private_key"])
+    pth.mine_block(n_mx=len(calls))
+
+expected = [{"block_number": block_number, "mxid": mxid, "emits": mx["data"]["reply"]["emits"]}
+            for block_number, block in enumerate(pth.blocks)
+            for mxid, mx in (block["data"]["messages"] or {}).items() if mx["to"] == cxid]
+assert len(expected) == 7
+assert {emit["mxid"]: emit["emits"] for emit in expected} == pth.get_all_emits(cxid)
+
+print("Paging through the emits with a cursor")
+for limit in (1, 2, 3, 7, 10):
+    pages, cursor = [], None
+    while True:
+        page = pth.query_emits(cxid, limit=limit, cursor=cursor)
+        assert len(page["emits"]) <= limit
+        pages.extend(page["emits"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == expected
+
+print("Restricting the block range and filtering lines")
+first, last = expected[2]["block_number"], expected[5]["block_number"]
+in_range = [emit for emit in expected if first <= emit["block_number"] <= last]
+assert pth.query_emits(cxid, from_block=first, to_block=last)["emits"] == in_range
+page = pth.query_emits(cxid, from_block=first, to_block=last, limit=2)
+assert page["emits"] == in_range[:2]
+assert pth.query_emits(cxid, to_block=last, cursor=page["next_cursor"])["emits"] == in_range[2:]
+assert pth.query_emits(cxid, from_block=last + 10)["emits"] == []
+
+
+
+def filtered(emits, keep):
+    # Messages of one block are mined in mempool order, so expected results are derived from the chain
+    result = []
+    for emit in emits:
+        lines = [line for line in emit["emits"] if keep(line)]
+        if lines:
+            result.append({**emit, "emits": lines})
+    return result
+
+
+evens = pth.query_emits(cxid, prefix="even")["emits"]
+assert evens == filtered(expected, lambda line: line.startswith("even"))
+assert sorted(line for emit in evens for line in emit["emits"]) == ["even 2", "even 4", "even 6"]
+assert pth.query_emits(cxid, contains="7")["emits"] == filtered(expected, lambda line: "7" in line)
+assert pth.query_emits(cxid, prefix="call", contains="3")["emits"] == \
+    filtered(expected, lambda line: line == "call 3")
+assert pth.query_emits("0" * 64) == {"emits": [], "next_cursor": None}
+
+
+def get(path, **query):
+    environ = {"PATH_INFO": path, "QUERY_STRING": urlencode(query), "REQUEST_METHOD": "GET"}
+    setup_testing_defaults(environ)
+    status = []
+    body = default_app()(environ, lambda code, headers: status.append(code))
+    return int(status[0].split()[0]), json.loads(b"".join(body))
+
+
+print("Paging through /get_emits")
+api.pth = pth
+pages, cursor = [], None
+while True:
+    query = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+    status, reply = get(f"/get_emits/{cxid}", **query)
+    assert status == 200 and reply["contract_id"] == cxid
+    pages.extend(reply["emits"])
+    cursor = reply["next_cursor"]
+    if cursor is None:
+        break
+assert pages == expected
+status, reply = get("/get_emits", contract_id=cxid, from_block=first, to_block=last, prefix="odd")
+assert status == 200 and reply["emits"] == filtered(in_range, lambda line: line.startswith("odd"))
+assert get("/get_emits", contract_id=cxid, limit="x")[0] == 400
+assert get("/get_emits")[0] == 400
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import time
+
+from pythereum import generate_wallet, sign_item, verify_signature, verify_key_pair
+from pythereum.wallet import key_cache_stats, clear_key_cache, KEY_CACHE_SIZE
+
+w1, w2 = generate_wallet("bob", "the", "builder"), generate_wallet()
+clear_key_cache()
+
+print("Decoding each key once")
+signature = sign_item(w1["private_key"], "hello")
+for _ in range(10):
+    assert verify_signature(signature, "hello", w1["public_key"])
+assert not verify_signature(signature, "goodbye", w1["public_key"])
+assert not verify_signature(signature, "hello", w2["public_key"])
+assert verify_key_pair(w1["public_key"], w1["private_key"])
+stats = key_cache_stats()
+print(stats)
+assert stats["verifying_keys"] == {"hits": 10, "misses": 2, "size": 2, "max_size": KEY_CACHE_SIZE}
+assert stats["signing_keys"] == {"hits": 1, "misses": 1, "size": 1, "max_size": KEY_CACHE_SIZE}
+
+print("Invalid keys are rejected every time and not cached")
+for _ in range(2):
+    try:
+        verify_signature(signature, "hello", "AAAA" * 16)
+        assert False, "Invalid public key accepted"
+    except AssertionError as e:
+        assert str(e) != "Invalid public key accepted"
+assert key_cache_stats()["verifying_keys"]["size"] == 2
+
+print("Cached verification speed")
+start = time.perf_counter()
+for _ in range(100):
+    verify_signature(signature, "hello", w1["public_key"])
+cached = (time.perf_counter() - start) / 100
+clear_key_cache()
+start = time.perf_counter()
+for _ in range(100):
+    verify_signature(signature, "hello", w1["public_key"])
+    clear_key_cache()
+uncached = (time.perf_counter() - start) / 100
+print(f"cached {cached * 1000:.3f} ms, uncached {uncached * 1000:.3f} ms per verification")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+from pythereum import generate_wallet, Pythereum
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+w3 = generate_wallet()
+
+pth = Pythereum(0)
+
+print("Mining blocks with transfers and change")
+for i in range(3):
+    pth.send_pth(w1["public_key"], w2["public_key"], 5, w1["private_key"])
+    pth.mine_block()
+pth.send_pth(w2["public_key"], w3["public_key"], 7, w2["private_key"])
+pth.send_pth(w1["public_key"], w3["public_key"], 2, w1["private_key"])
+pth.mine_block()
+
+print("Checking transaction locations against a chain scan")
+change = 0
+for block_number, block in enumerate(pth.blocks):
+    for position, (txid, tx) in enumerate(block["data"]["transactions"].items()):
+        assert pth.get_transaction_location(txid) == (block_number, position)
+        assert pth.get_transaction(txid) == tx
+        change += "change_from" in tx
+assert change >= 4, "Expected change transactions on the chain"
+
+print("Checking block lookups by hash against a chain scan")
+for block_number, block in enumerate(pth.blocks):
+    assert pth.get_block(block["block_hash"]) is block
+    assert pth.get_block(block_number) is block
+    assert pth[block["block_hash"]] is block
+
+print("Unknown ids are not found")
+assert pth.get_transaction_location("0" * 64) is None
+assert pth.get_transaction("0" * 64) is None
+assert pth.get_block("0" * 64) is None
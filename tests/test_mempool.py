@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import time
+import secrets
+
+from pythereum import generate_wallet, sign_item, Pythereum, Transaction
+from pythereum.index import UTXOSet
+from pythereum.mempool import Mempool, item_size
+from pythereum.transaction import signed_item
+
+w1 = generate_wallet("bob", "the", "builder")
+w2, w3, w4, miner = generate_wallet(), generate_wallet(), generate_wallet(), generate_wallet()
+
+pth = Pythereum(0)
+for w in (w2, w3, w4):
+    pth.send_pth(w1["public_key"], w["public_key"], 10, w1["private_key"])
+    pth.mine_block()
+
+print("Mining the highest fee per byte first")
+low = pth.send_pth(w2["public_key"], w1["public_key"], 1, w2["private_key"], fee=0.01)
+high = pth.send_pth(w3["public_key"], w1["public_key"], 1, w3["private_key"], fee=0.5)
+mid = pth.send_pth(w4["public_key"], w1["public_key"], 1, w4["private_key"], fee=0.1)
+block = pth.mine_block(n_tx=2, fee_to=miner["public_key"])
+mined = [tx for tx in block["data"]["transactions"].values() if "change_from" not in tx and "fee_from" not in tx]
+assert [tx["txid"] for tx in mined] == [high["txid"], mid["txid"]]
+assert pth.get_balance(miner["public_key"]) == 0.6
+assert pth.get_balance(w3["public_key"]) == 10 - 1 - 0.5
+assert list(pth.get_mempool("transactions")) == [low["txid"]]
+
+print("Rejecting a copy of a pending transaction with its fee changed")
+for fee, version, message in ((0.5, 3, "Invalid Signature"), (0.0, 3, "Invalid Signature"),
+                              (low["fee"], 2, "Invalid Signature"),
+                              (0.5, 1, "A fee requires a version 2 signature"), (0.0, 1, "Invalid Signature")):
+    try:
+        Transaction(low["from"], low["to"], low["signed_amount"], low["signature"], low["input_txids"], fee=fee,
+                    signature_version=version)
+        assert False, f"Accepted a copied signature with fee {fee}"
+    except AssertionError as e:
+        assert str(e) == message, str(e)
+assert Transaction(low["from"], low["to"], low["signed_amount"], low["signature"], low["input_txids"],
+                   fee=low["fee"]).txid != low["txid"]
+print("Rejecting a copy of a pending transaction with its recipient, inputs or data changed")
+for t_to, input_txids, data in ((w2["public_key"], low["input_txids"], None), (low["to"], [], None),
+                                (low["to"], low["input_txids"] + ["0" * 64], None),
+                                (low["to"], low["input_txids"], "changed")):
+    try:
+        Transaction(low["from"], t_to, low["signed_amount"], low["signature"], input_txids, data=data,
+                    fee=low["fee"])
+        assert False, "Accepted a copied signature with other fields changed"
+    except AssertionError as e:
+        assert str(e) == "Invalid Signature", str(e)
+assert Transaction(low["from"], low["to"], low["signed_amount"], low["signature"], low["input_txids"][::-1],
+                   fee=low["fee"]).txid
+assert list(pth.get_mempool("transactions")) == [low["txid"]]
+legacy = sign_item(w2["private_key"], signed_item(1, w2["public_key"], version=1))
+assert Transaction(w2["public_key"], w1["public_key"], 1, legacy, [], signature_version=1).fee == 0
+
+print("Rejecting double spends and replacing a pending transaction with a higher fee")
+try:
+    pth.send_pth(w2["public_key"], w1["public_key"], 2, w2["private_key"], fee=0.001)
+    assert False, "Sent without unspent outputs"
+except AssertionError as e:
+    assert "pending transactions spend the rest" in str(e)
+for fee in (0.001, 0.01):
+    try:
+        pth.send_pth(w2["public_key"], w1["public_key"], 2, w2["private_key"], fee=fee, replaces=low["txid"])
+        assert False, "Replaced a pending transaction without a higher fee"
+    except ValueError as e:
+        assert "needs a fee above 0.01" in str(e)
+replacement = pth.send_pth(w2["public_key"], w1["public_key"], 2, w2["private_key"], fee=1, replaces=low["txid"])
+assert list(pth.get_mempool("transactions")) == [replacement["txid"]]
+
+print("Replacing a pending transaction after the sender received a newer output")
+node = Pythereum(0)
+sender, recipient = generate_wallet(), generate_wallet()
+node.send_pth(w1["public_key"], sender["public_key"], 10, w1["private_key"])
+node.mine_block()
+original = node.send_pth(sender["public_key"], recipient["public_key"], 3, sender["private_key"], fee=0.1)
+node.send_pth(w1["public_key"], sender["public_key"], 5, w1["private_key"], fee=0.5)
+node.mine_block(n_tx=1)
+assert list(node.get_mempool("transactions")) == [original["txid"]]
+bumped = node.send_pth(sender["public_key"], recipient["public_key"], 3, sender["private_key"], fee=0.2,
+                       replaces=original["txid"])
+assert set(original["input_txids"]) <= set(bumped["input_txids"])
+assert list(node.get_mempool("transactions")) == [bumped["txid"]]
+node.mine_block(fee_to=miner["public_key"])
+assert node.get_balance(recipient["public_key"]) == 3
+assert node.get_balance(miner["public_key"]) == 0.2
+
+print("Rejecting invalid inputs at admission")
+utxo = UTXOSet()
+for block in pth.blocks:
+    utxo.add_block(block)
+mempool = Mempool()
+assert mempool.add_transaction(dict(low), utxo) is None
+mempool.pop_transactions()
+for tx in ({**low, "input_txids": []}, {**low, "input_txids": [replacement["txid"]]},
+           {**low, "amount": 1e15}, {**low, "change_from": mid["txid"]}):
+    try:
+        mempool.add_transaction(tx, utxo)
+        assert False, f"Admitted invalid transaction {tx}"
+    except ValueError:
+        pass
+assert not mempool.transactions
+
+print("Keeping transactions that do not fit in the block")
+assert pth.mine_block(max_tx_bytes=item_size(replacement) - 1) is None
+block = pth.mine_block(max_tx_bytes=item_size(replacement))
+assert replacement["txid"] in block["data"]["transactions"]
+assert pth.get_balance(w2["public_key"]) == 10 - 2  # No fee_to, the fee comes back with the change
+assert not pth.get_mempool("transactions")
+assert pth.verify_chain()["result"] and pth.verify_utxo()["result"]
+
+print("Expiring and evicting old items")
+mempool = Mempool(ttl=60, max_size=3)
+pth = Pythereum(0, mempool=mempool)
+now = time.time()
+for i in range(5):
+    mempool.add_message({"mxid": f"old-{i}", "time": now - 120 + i})
+assert not pth.get_mempool("messages")
+for i in range(5):
+    mempool.add_message({"mxid": f"new-{i}", "time": now + i})
+assert list(pth.get_mempool("messages")) == ["new-2", "new-3", "new-4"]
+assert pth.mempool_stats["expired"]["messages"] == 5
+assert pth.mempool_stats["evicted"]["messages"] == 2
+assert pth.mempool_stats["size"]["messages"] == 3
+assert not Pythereum(0).get_mempool("messages")
+mempool = Mempool(max_size=1)
+for add, mem_type, id_key in ((mempool.add_message, "messages", "mxid"), (mempool.add_contract, "contracts", "cxid")):
+    add({id_key: "pending", "time": now})
+    try:
+        add({id_key: "older", "time": now - 1})
+        assert False, "Item older than every pending one was admitted to a full mempool"
+    except ValueError:
+        pass
+    assert list(getattr(mempool, mem_type)) == ["pending"]
+
+print("Keeping the mempool within its byte budget")
+
+
+def transaction(fee, sender="a" * 64):
+    return {"from": sender, "to": "b" * 64, "time": float(int(time.time())), "signature": "null", "amount": 1.0,
+            "fee": fee, "txid": secrets.token_hex(32), "input_txids": [secrets.token_hex(32)], "data": None}
+
+
+size = item_size(transaction(0.5))
+mempool = Mempool(max_bytes=3 * size)
+pth = Pythereum(0, mempool=mempool)
+low, mid, high = transaction(0.1), transaction(0.5, "c" * 64), transaction(0.9)
+for tx in (low, mid, high):
+    mempool.add_transaction(tx)
+assert pth.mempool_stats["bytes"]["transactions"] == 3 * size
+mempool.add_transaction(transaction(0.7, "d" * 64))
+assert low["txid"] not in pth.get_mempool("transactions")
+assert pth.mempool_stats["evicted"]["transactions"] == 1
+try:
+    mempool.add_transaction(transaction(0.2))
+    assert False, "Transaction paying less than every pending one was admitted"
+except ValueError:
+    pass
+assert len(pth.get_mempool("transactions")) == 3 and pth.mempool_stats["bytes"]["transactions"] == 3 * size
+try:
+    mempool.add_message({"mxid": "big", "time": time.time(), "data": {"args": "x" * 4 * size, "reply": None}})
+    assert False, "Message larger than the budget was admitted"
+except ValueError:
+    pass
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import time
+import secrets
+import threading
+
+from pythereum import generate_wallet, Pythereum
+from pythereum.mempool import Mempool, item_size
+from pythereum.validation import ChainVerifier
+
+THREADS = 16
+PER_THREAD = 250
+
+mempool = Mempool()
+senders = [secrets.token_hex(32) for _ in range(THREADS)]
+submitted = [[] for _ in range(THREADS)]
+popped = []
+done = threading.Event()
+
+
+def submit(i):
+    for j in range(PER_THREAD):
+        # Every other transaction shares a sender, so shards are contended as well
+        transaction = {"from": senders[i if j % 2 else 0], "to": senders[-1], "time": time.time(),
+                       "signature": "null", "amount": 1.0, "fee": secrets.randbelow(1000) / 1000,
+                       "txid": secrets.token_hex(32), "input_txids": [secrets.token_hex(32)], "data": None}
+        mempool.add_transaction(transaction)
+        submitted[i].append(transaction["txid"])
+
+
+def mine():
+    while not done.is_set():
+        popped.extend(mempool.pop_transactions(20))
+
+
+print(f"Submitting {THREADS * PER_THREAD} transactions from {THREADS} threads while mining")
+miner = threading.Thread(target=mine)
+miner.start()
+threads = [threading.Thread(target=submit, args=(i,)) for i in range(THREADS)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+done.set()
+miner.join()
+
+print("Checking nothing was lost or duplicated")
+remaining = mempool.pop_transactions(THREADS * PER_THREAD)
+densities = [tx["fee"] / item_size(tx) for tx in remaining]
+assert densities == sorted(densities, reverse=True)
+txids = [tx["txid"] for tx in popped + remaining]
+assert len(txids) == len(set(txids)) == THREADS * PER_THREAD
+assert set(txids) == {txid for txids in submitted for txid in txids}
+assert not mempool.transactions and mempool.stats()["size"]["transactions"] == 0
+
+print("Sending from several threads while a node mines")
+pth = Pythereum(0, verifier=ChainVerifier(signatures=True))
+bank = generate_wallet("bob", "the", "builder")
+wallets = [generate_wallet() for _ in range(4)]
+for wallet in wallets:
+    pth.send_pth(bank["public_key"], wallet["public_key"], 100, bank["private_key"])
+    pth.mine_block()
+done.clear()
+sent = []
+
+
+def send(wallet, recipient):
+    for _ in range(20):
+        try:
+            sent.append(pth.send_pth(wallet["public_key"], recipient["public_key"], 1, wallet["private_key"]))
+        except (AssertionError, ValueError):
+            # Every output of the wallet is pending or was spent by a block mined meanwhile
+            time.sleep(0.001)
+
+
+def mine_node():
+    while not done.is_set():
+        pth.mine_block(n_tx=8)
+
+
+miner = threading.Thread(target=mine_node)
+miner.start()
+threads = [threading.Thread(target=send, args=(wallet, wallets[i - 1])) for i, wallet in enumerate(wallets)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+done.set()
+miner.join()
+while pth.mine_block(n_tx=50):
+    pass
+assert sent and all(pth.get_transaction_location(tx["txid"]) for tx in sent)
+assert pth.verify_utxo()["result"] and pth.verify_chain(full=True)["result"]
+assert sum(pth.get_balance(wallet["public_key"]) for wallet in wallets) == 4 * 100
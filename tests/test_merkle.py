@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import hashlib
+import secrets
+
+from pythereum import generate_wallet, Pythereum
+from pythereum.block import MerkleTree, MerkleAccumulator, verify_merkle_proof, merkle_mode
+
+print("Comparing the incremental accumulator with MerkleTree")
+for mode in ("hex", "binary"):
+    for n in range(1, 40):
+        leaves = [secrets.token_hex(32) for _ in range(n)]
+        tree = MerkleTree(*leaves, mode=mode)
+        tree.make_tree()
+        accumulator = MerkleAccumulator(mode=mode)
+        for leaf in leaves:
+            accumulator.append(leaf)
+        assert accumulator.root == tree.root
+        for i, leaf in enumerate(leaves):
+            assert verify_merkle_proof(leaf, accumulator.proof(i), tree.root, mode)
+            assert not verify_merkle_proof(leaves[i - 1], accumulator.proof(i), tree.root, mode) or n == 1
+
+print("Checking the binary merkle mode hashes raw digests")
+leaves = [secrets.token_hex(32) for _ in range(3)]
+tree = MerkleTree(*leaves, mode="binary")
+tree.make_tree()
+left = hashlib.sha256(bytes.fromhex(leaves[0]) + bytes.fromhex(leaves[1])).digest()
+assert tree.root == hashlib.sha256(left + bytes.fromhex(leaves[2])).hexdigest()
+hex_tree = MerkleTree(*leaves)
+hex_tree.make_tree()
+assert hex_tree.root != tree.root
+
+print("Checking transaction inclusion proofs against block headers")
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+pth = Pythereum(0)
+pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+pth.mine_block()
+pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+pth.send_pth(w2["public_key"], w1["public_key"], 1, w2["private_key"])
+pth.mine_block()
+assert len(pth.top_block["data"]["transactions"]) == 4
+for txid in pth.top_block["data"]["transactions"]:
+    proof = pth.get_transaction_proof(txid)
+    header = pth[proof["block_number"]]["header"]
+    assert verify_merkle_proof(txid, proof["proof"], header["merkle_root"]["transactions"], proof["mode"])
+assert pth.get_transaction_proof("0" * 64) is None
+assert proof["mode"] == merkle_mode(pth.top_block["header"]["version"]) == "binary"
+assert pth.verify_chain()["result"]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+from pythereum import miner
+from pythereum.block import Block, hash_header
+from pythereum.difficulty import target_from_difficulty
+from pythereum.miner import Miner
+
+
+def crash(*args):
+    os._exit(3)
+
+
+print("Mining with two worker processes")
+parallel = Miner(workers=2)
+assert parallel.workers == 2
+for number in range(1, 4):
+    block = Block(block_number=number, block_nonce="0" * 32, previous_block_hash="ab" * 32)
+    parallel.mine(block, target_from_difficulty(3))
+    assert block.hash.startswith("000") and block.validate()
+    assert hash_header(block.jsonify()["header"]) == block.hash
+    assert parallel.last_stats["workers"] == 2 and parallel.last_stats["hashes"] > 0
+
+print("Only None means every core")
+assert Miner(workers=None).workers == (os.cpu_count() or 1)
+for workers in (0, -1):
+    try:
+        Miner(workers=workers)
+        assert False, f"Miner accepted {workers} workers"
+    except AssertionError as e:
+        assert str(e) == "Miner needs at least one worker"
+
+print("A worker dying before it reports fails the search instead of hanging")
+miner._search = crash
+started = time.time()
+try:
+    parallel.mine(Block(block_number=1, block_nonce="0" * 32, previous_block_hash="ab" * 32),
+                  target_from_difficulty(60))
+    assert False, "Mining succeeded without workers"
+except RuntimeError as e:
+    assert "exit code 3" in str(e)
+assert time.time() - started < 10
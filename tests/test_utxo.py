@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+from pythereum import generate_wallet, Pythereum
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+w3 = generate_wallet()
+
+pth = Pythereum(0)
+
+print("Sending PTH between three wallets")
+for i in range(3):
+    pth.send_pth(w1["public_key"], w2["public_key"], 5, w1["private_key"])
+    pth.mine_block()
+pth.send_pth(w2["public_key"], w3["public_key"], 7, w2["private_key"])
+pth.mine_block()
+pth.send_pth(w3["public_key"], w1["public_key"], 5, w3["private_key"])
+pth.mine_block()
+
+print("Checking UTXO set against a full chain scan")
+assert pth.verify_utxo()["result"], pth.verify_utxo()["message"]
+
+utxos = {w["public_key"]: pth.get_utxo(w["public_key"]) for w in (w1, w2, w3)}
+pth.rebuild_utxo()
+for public_key, txids in utxos.items():
+    assert pth.get_utxo(public_key) == txids
+assert pth.verify_utxo()["result"]
+print(utxos)
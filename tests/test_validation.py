@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import json
+import time
+import threading
+from wsgiref.util import setup_testing_defaults
+
+from pythereum import generate_wallet, sign_item, Pythereum
+from pythereum.transaction import signed_item
+from pythereum.api import api
+from pythereum.api.bottle import default_app
+from pythereum.validation import ChainVerifier, transaction_id
+
+w1 = generate_wallet("bob", "the", "builder")
+w2 = generate_wallet()
+pth = Pythereum(0)
+for i in range(12):
+    pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+    pth.mine_block()
+chain = pth.blocks
+
+print("Verifying the chain in chunks across worker processes")
+assert ChainVerifier(workers=1, chunk_size=4).verify(chain) is None
+assert ChainVerifier(workers=3, chunk_size=2).verify(chain) is None
+assert ChainVerifier(workers=3, chunk_size=2).verify(chain, 7) is None
+assert ChainVerifier(workers=None).workers == (os.cpu_count() or 1)
+for workers in (0, -1):
+    try:
+        ChainVerifier(workers=workers)
+        assert False, f"Verifier accepted {workers} workers"
+    except AssertionError as e:
+        assert str(e) == "Verifier needs at least one worker"
+
+print("Only blocks after the last verified one are checked again")
+assert pth.verify_chain()["result"]
+chain[5]["header"]["block_time"] += 1
+assert pth.verify_chain()["result"]
+result = pth.verify_chain(full=True)
+assert not result["result"] and result["message"] == "Block#5 has incorrect hash"
+assert ChainVerifier(workers=3, chunk_size=2).verify(chain) == (5, "Block#5 has incorrect hash")
+assert not pth.verify_chain()["result"]
+chain[5]["header"]["block_time"] -= 1
+assert pth.verify_chain()["result"]
+
+print("Broken links and merkle roots are reported")
+chain[9]["header"]["previous_block_hash"] = chain[7]["block_hash"]
+assert ChainVerifier(workers=2, chunk_size=3).verify(chain)[0] == 9
+chain[9]["header"]["previous_block_hash"] = chain[8]["block_hash"]
+root = chain[10]["header"]["merkle_root"]["transactions"]
+chain[10]["header"]["merkle_root"]["transactions"] = "0" * 64
+assert ChainVerifier().verify(chain)[0] == 10
+
+print("Running validation as a background job")
+job = pth.start_validation(full=True)
+assert pth.get_validation(job["job_id"]) is not None and pth.get_validation("missing") is None
+while pth.get_validation(job["job_id"])["state"] == "running":
+    time.sleep(0.01)
+status = pth.get_validation(job["job_id"])
+assert not status["result"] and status["first_failure"]["block_number"] == 10
+assert status["blocks_total"] == len(chain)
+chain[10]["header"]["merkle_root"]["transactions"] = root
+job = pth.start_validation(full=True)
+while pth.get_validation(job["job_id"])["state"] == "running":
+    time.sleep(0.01)
+status = pth.get_validation(job["job_id"])
+assert status["result"] and status["blocks_verified"] == len(chain) and status["first_failure"] is None
+
+print("Re-verifying the signatures in the blocks")
+pth.create_contract("def hello():\n    return 'hi'", w1["public_key"], w1["private_key"])
+pth.mine_block()
+chain = pth.blocks
+assert ChainVerifier(signatures=True).verify(chain) is None
+assert ChainVerifier(workers=2, chunk_size=3, signatures=True).verify(chain) is None
+tx = next(tx for tx in chain[4]["data"]["transactions"].values() if "change_from" not in tx)
+signed_amount, tx["signed_amount"] = tx["signed_amount"], "100"
+assert ChainVerifier().verify(chain) is None
+failure = ChainVerifier(workers=2, chunk_size=3, signatures=True).verify(chain)
+assert failure == (4, f"Block#4 has an invalid signature on transaction {tx['txid']}")
+tx["signed_amount"] = signed_amount
+assert ChainVerifier(signatures=True).verify(chain) is None
+print("Checking transactions signed in the version 1 format")
+tx["signature"] = sign_item(w1["private_key"], signed_item(signed_amount, tx["from"], version=1))
+assert ChainVerifier(signatures=True).verify(chain)[0] == 4
+del tx["signature_version"]
+assert ChainVerifier(signatures=True).verify(chain) is None
+cx = next(iter(chain[-1]["data"]["contracts"].values()))
+cx["code"] += "\n"
+assert ChainVerifier(signatures=True).verify(chain)[0] == len(chain) - 1
+cx["code"] = cx["code"][:-1]
+
+print("Checking that signed transactions move what was signed")
+miner = generate_wallet()
+pth.send_pth(w1["public_key"], w2["public_key"], 2, w1["private_key"], fee=0.5)
+pth.mine_block(fee_to=miner["public_key"])
+chain = pth.blocks
+number = len(chain) - 1
+assert ChainVerifier(signatures=True).verify(chain) is None
+transactions = chain[number]["data"]["transactions"].values()
+paid = next(tx for tx in transactions if "signed_amount" in tx)
+fee = next(tx for tx in transactions if "fee_from" in tx)
+change = next(tx for tx in transactions if "change_from" in tx)
+for tx, field, delta, message in ((paid, "amount", 1, "moves"), (change, "amount", -1, "moves"),
+                                  (fee, "amount", 1, "pays a fee"), (change, "change_from", "0", "without")):
+    tx[field] += delta
+    assert ChainVerifier().verify(chain) is None
+    failure = ChainVerifier(signatures=True).verify(chain)
+    assert failure[0] == number and message in failure[1], failure
+    tx[field] = tx[field][:-1] if isinstance(delta, str) else tx[field] - delta
+assert ChainVerifier(signatures=True).verify(chain) is None
+
+print("Checking the recipient and txid of signed transactions")
+recipient = paid["to"]
+for field, value, message in (("to", miner["public_key"], "invalid signature"),
+                              ("time", paid["time"] + 1, "does not match its fields"),
+                              ("txid", "0" * 64, "does not match its fields")):
+    original, paid[field] = paid[field], value
+    assert ChainVerifier().verify(chain) is None
+    failure = ChainVerifier(signatures=True).verify(chain)
+    assert failure[0] == number and message in failure[1], failure
+    paid[field] = original
+paid["to"] = miner["public_key"]
+paid["txid"] = transaction_id(paid)
+failure = ChainVerifier(signatures=True).verify(chain)
+assert failure[0] == number and "invalid signature" in failure[1], failure
+paid["to"] = recipient
+paid["txid"] = transaction_id(paid)
+assert ChainVerifier(signatures=True).verify(chain) is None
+
+
+class GatedVerifier(ChainVerifier):
+    """
+    Holds verifications running outside the main thread until released, and records the length they saw
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.lengths = []
+
+    def verify(self, chain, start=0, stop=None, progress=None):
+        if threading.current_thread() is not threading.main_thread():
+            self.release.wait()
+        self.lengths.append(len(chain))
+        return super().verify(chain, start, stop, progress)
+
+
+print("Background validation works on a fixed snapshot and cannot skip a concurrent failure")
+verifier = GatedVerifier()
+pth = Pythereum(0, verifier=verifier)
+for i in range(4):
+    pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+    pth.mine_block()
+job = pth.start_validation(full=True)
+total = job["blocks_total"]
+pth.send_pth(w1["public_key"], w2["public_key"], 1, w1["private_key"])
+pth.mine_block()
+chain = pth.blocks
+chain[3]["header"]["block_time"] += 1
+assert pth.verify_chain(full=True) == {"result": False, "message": "Block#3 has incorrect hash"}
+chain[3]["header"]["block_time"] -= 1
+verifier.release.set()
+while pth.get_validation(job["job_id"])["state"] == "running":
+    time.sleep(0.01)
+status = pth.get_validation(job["job_id"])
+assert status["result"] and status["blocks_total"] == total == len(chain) - 1
+assert verifier.lengths == [len(chain), total]
+# The job passed, but the failure found meanwhile keeps the checkpoint below block 3
+chain[4]["header"]["block_time"] += 1
+assert not pth.verify_chain()["result"]
+chain[4]["header"]["block_time"] -= 1
+assert pth.verify_chain()["result"]
+
+print("Reading the /validate flags from the form or the query string")
+
+
+def post(path, query="", form=""):
+    body = form.encode()
+    environ = {"PATH_INFO": path, "QUERY_STRING": query, "REQUEST_METHOD": "POST", "wsgi.input": io.BytesIO(body),
+               "CONTENT_TYPE": "application/x-www-form-urlencoded", "CONTENT_LENGTH": str(len(body))}
+    setup_testing_defaults(environ)
+    status = []
+    reply = default_app()(environ, lambda code, headers: status.append(code))
+    return int(status[0].split()[0]), json.loads(b"".join(reply))
+
+
+api.pth = pth
+for query, form in (("", "wait=true&full=true"), ("wait=true&full=true", ""), ("full=true", "wait=yes")):
+    assert post("/validate", query, form) == (200, {"status_code": 200, "result": True,
+                                                    "message": "Blocks are valid and consistent"})
+status, reply = post("/validate", form="full=true")
+assert status == 202 and reply["blocks_total"] == len(pth.blocks)
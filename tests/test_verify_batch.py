@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import time
+
+from pythereum import generate_wallet, sign_item, verify_signature, verify_batch
+from pythereum.wallet import close_verify_pool
+
+wallets = [generate_wallet() for _ in range(4)]
+items = []
+for i in range(40):
+    w = wallets[i % len(wallets)]
+    item = f"item {i}"
+    items.append((sign_item(w["private_key"], item), item, w["public_key"]))
+
+print("Every item gets its own result")
+assert verify_batch(items) == [True] * len(items)
+assert verify_batch(items, workers=2) == [True] * len(items)
+assert verify_batch([]) == []
+
+bad = list(items)
+bad[3] = (bad[3][0], "tampered", bad[3][2])
+bad[7] = ("not base64!", bad[7][1], bad[7][2])
+bad[11] = (bad[11][0], bad[11][1], "AAAA" * 16)
+bad[15] = (bad[15][0], bad[15][1], wallets[0]["public_key"])
+expected = [i not in (3, 7, 11, 15) for i in range(len(items))]
+assert verify_batch(bad) == expected
+assert verify_batch(bad, workers=3) == expected
+assert verify_batch(bad) == [verify_signature(*item) if i not in (7, 11) else False for i, item in enumerate(bad)]
+
+print("Only None means every core")
+try:
+    verify_batch(items, workers=0)
+    assert False, "Accepted 0 workers"
+except AssertionError as e:
+    assert str(e) == "verify_batch needs at least one worker"
+
+print("Batch against one at a time")
+wallets = [generate_wallet() for _ in range(8)]
+items = [(sign_item(wallets[i % 8]["private_key"], f"item {i}"), f"item {i}", wallets[i % 8]["public_key"])
+         for i in range(200)]
+start = time.perf_counter()
+assert all(verify_signature(*item) for item in items)
+single = time.perf_counter() - start
+start = time.perf_counter()
+assert all(verify_batch(items))
+grouped = time.perf_counter() - start
+timings = []
+for _ in range(2):
+    start = time.perf_counter()
+    assert all(verify_batch(items, workers=2))
+    timings.append(time.perf_counter() - start)
+close_verify_pool()
+print(f"{len(items)} signatures: one at a time {single * 1000:.1f} ms, grouped {grouped * 1000:.1f} ms, "
+      f"2 workers {timings[0] * 1000:.1f} ms starting the pool, {timings[1] * 1000:.1f} ms reusing it")